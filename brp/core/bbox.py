@@ -8,41 +8,108 @@ following entries: [xmin, ymin, xmax, ymax]
 from __future__ import division
 from math import log10
 
+import numpy
 
-def find_bounding_box(lx, ly, bbox=None):
+# Number of data points that are reduced at a time, chosen such that the
+# temporary arrays stay in the CPU cache.
+CHUNK_SIZE = 2 ** 16
+
+
+def _chunk_bbox(x, y, x_log, y_log):
+    '''
+    Find the bounding box of two equally long NumPy arrays.
+
+    Points with non finite coordinates (NaN, inf) are ignored, as are points
+    with non-positive coordinates on logarithmic axes. Returns None if no
+    points remain.
+    '''
+    mask = numpy.isfinite(x)
+    mask &= numpy.isfinite(y)
+    with numpy.errstate(invalid='ignore'):
+        if x_log:
+            mask &= x > 0
+        if y_log:
+            mask &= y > 0
+    if not mask.all():
+        x = x[mask]
+        y = y[mask]
+    if not len(x):
+        return None
+    return (x.min().item(), y.min().item(), x.max().item(), y.max().item())
+
+
+def find_bounding_box(lx, ly, bbox=None, x_log=False, y_log=False):
     '''
     Find bounding box given list of numbers for x and y.
 
     Bounding box is given as [xmin, ymin, xmax, ymax].
-    Note : assumes that lx and ly can be accessed by index.
 
     >>> from brp.core.bbox import find_bounding_box
     >>> find_bounding_box([5, 0, 10], [6, 0, 10])
     (0, 0, 10, 10)
+    >>> find_bounding_box([5, float('nan'), 10], [6, 0, 10], y_log=True)
+    (5.0, 6, 10.0, 10)
+    >>> find_bounding_box([], [], (0, 0, 1, 1))
+    (0, 0, 1, 1)
 
     Arguments:
 
-        * `lx` -- List of data x coordinates.
-        * `ly` -- List of data y coordinates.
+        * `lx` -- List or NumPy array of data x coordinates.
+        * `ly` -- List or NumPy array of data y coordinates.
         * `bbox` -- Bounding box to be updated with the new data in lx and ly.
+        * `x_log` -- Boolean, True if x axis is logarithmic (non-positive x
+          coordinates are then ignored), default False.
+        * `y_log` -- Boolean, True if y axis is logarithmic (non-positive y
+          coordinates are then ignored), default False.
 
     Returns:
-        A tuple representing a bounding box : (xmin, ymin, xmax, ymax).
+        A tuple representing a bounding box : (xmin, ymin, xmax, ymax). If
+        there are no (finite) data points, `bbox` is returned (None if no
+        `bbox` was provided).
+
+    Note:
+        Points with NaN or infinite coordinates are ignored. The data is
+        reduced in chunks of CHUNK_SIZE points, so that each chunk is only
+        read from memory once.
     '''
-    if not bbox:
-        bbox = [lx[0], ly[0], lx[0], ly[0]]  # [xmin, ymin, xmax, ymax]
-    else:
-        bbox = list(bbox)
-    for x, y in zip(lx, ly):
-        if x < bbox[0]:
-            bbox[0] = x
-        elif x > bbox[2]:
-            bbox[2] = x
-        if y < bbox[1]:
-            bbox[1] = y
-        elif y > bbox[3]:
-            bbox[3] = y
-    return tuple(bbox)
+    lx = numpy.asarray(lx)
+    ly = numpy.asarray(ly)
+    assert lx.shape == ly.shape
+
+    if bbox is not None:
+        bbox = tuple(bbox)
+    for start in range(0, len(lx), CHUNK_SIZE):
+        tmp = _chunk_bbox(lx[start:start + CHUNK_SIZE],
+                          ly[start:start + CHUNK_SIZE], x_log, y_log)
+        if tmp is None:
+            continue
+        elif bbox is None:
+            bbox = tmp
+        else:
+            bbox = combine_bbox(bbox, tmp)
+    return bbox
+
+
+def find_bounding_box_chunked(chunks, bbox=None, x_log=False, y_log=False):
+    '''
+    Find bounding box for data that is provided in chunks.
+
+    Arguments:
+
+        * `chunks` -- Iterable of (lx, ly) pairs, each a chunk of the data.
+        * `bbox`, `x_log`, `y_log` -- See find_bounding_box.
+
+    Returns:
+        A tuple representing a bounding box : (xmin, ymin, xmax, ymax), or
+        None if there is no (finite) data and no `bbox` was provided.
+
+    >>> from brp.core.bbox import find_bounding_box_chunked
+    >>> find_bounding_box_chunked([([1, 2], [3, 4]), ([0, 1], [5, 6])])
+    (0, 3, 2, 6)
+    '''
+    for lx, ly in chunks:
+        bbox = find_bounding_box(lx, ly, bbox, x_log, y_log)
+    return bbox
 
 
 def stretch_bbox(bbox, x_factor, y_factor, x_log, y_log):
@@ -96,6 +163,9 @@ def stretch_bbox(bbox, x_factor, y_factor, x_log, y_log):
 
 
 def combine_bbox(bbox1, bbox2):
+    '''
+    Return the smallest bounding box that contains both bounding boxes.
+    '''
     bbox1 = list(bbox1)
     bbox2 = list(bbox2)
     return tuple([min(bbox1[0], bbox2[0]), min(bbox1[1], bbox2[1]),
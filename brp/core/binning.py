@@ -0,0 +1,251 @@
+'''
+Vectorized binning of data for histograms.
+
+The data is processed in chunks of BIN_CHUNK_SIZE points, the bin index of
+every point is found with array arithmetic and the bins are filled with
+numpy.bincount. Memory-mapped data is thus never loaded as a whole.
+'''
+from __future__ import division
+from math import log10
+
+import numpy
+
+from brp.core.columns import open_column
+
+# Number of data points that are binned at a time (bounds the size of the
+# temporary arrays).
+BIN_CHUNK_SIZE = 2 ** 20
+# Integer data spanning at most this many distinct values is first counted
+# per value with numpy.bincount (no floating point work per data point).
+INTEGER_FAST_PATH_RANGE = 2 ** 20
+
+
+def _bin_indices(x, lower, upper, n_bins):
+    '''
+    Find bin indices for the values in x, and a mask of values inside range.
+
+    The bins are [lower, lower + w), [lower + w, lower + 2w) ... and the last
+    bin also includes values exactly on the upper edge.
+    '''
+    with numpy.errstate(invalid='ignore'):
+        mask = (x >= lower) & (x <= upper)
+    if upper == lower:
+        # Zero width range (constant data), the values inside of it are on
+        # the upper edge.
+        return numpy.full(numpy.count_nonzero(mask), n_bins - 1,
+                          dtype=numpy.intp), mask
+    bin_width = (upper - lower) / n_bins
+    idx = ((x[mask] - lower) / bin_width).astype(numpy.intp)
+    # Values on the upper edge (or pushed there by rounding) go in last bin.
+    numpy.minimum(idx, n_bins - 1, out=idx)
+    return idx, mask
+
+
+def bin_data_2d(x_seq, y_seq, x_bins, y_bins, hist_bbox, weights=None):
+    '''
+    Create a 2d histogram.
+
+    Arguments:
+
+        * `x_seq` -- Sequence or NumPy array of data x coordinates, or a
+          .npy file name or raw buffer (see brp.core.columns.open_column).
+        * `y_seq` -- Data y coordinates, like `x_seq`.
+        * `x_bins` -- Number of bins in the x direction.
+        * `y_bins` -- Number of bins in the y direction.
+        * `hist_bbox` -- Bounding box of the histogram, like
+          (xmin, ymin, xmax, ymax).
+        * `weights` -- Optional sequence or NumPy array of weights, one per
+          data point. If not provided every data point counts as 1.
+
+    Returns:
+        NumPy array of shape (x_bins, y_bins) with the counts (integers) or
+        the sums of the weights (floats) for each bin.
+
+    Note:
+        Points outside of `hist_bbox` and points with NaN coordinates are
+        ignored, points on the upper edges of `hist_bbox` end up in the last
+        bins (also when `hist_bbox` has zero width or height).
+
+    >>> from brp.core.binning import bin_data_2d
+    >>> bin_data_2d([0, 0.5, 1, 2], [0, 0, 1, 1], 2, 2, (0, 0, 1, 1)).tolist()
+    [[1, 0], [1, 1]]
+    >>> bin_data_2d([1, 1, 1], [0, 1, 2], 3, 3, (1, 0, 1, 2)).tolist()
+    [[0, 0, 0], [0, 0, 0], [1, 1, 1]]
+    '''
+    x_seq = numpy.asarray(open_column(x_seq))
+    y_seq = numpy.asarray(open_column(y_seq))
+    assert x_seq.shape == y_seq.shape
+    if weights is not None:
+        weights = numpy.asarray(open_column(weights))
+        assert weights.shape == x_seq.shape
+        ar = numpy.zeros(x_bins * y_bins, dtype=numpy.float64)
+    else:
+        ar = numpy.zeros(x_bins * y_bins, dtype=numpy.int_)
+
+    for start in range(0, len(x_seq), BIN_CHUNK_SIZE):
+        s = slice(start, start + BIN_CHUNK_SIZE)
+        x_idx, x_mask = _bin_indices(x_seq[s], hist_bbox[0], hist_bbox[2],
+                                     x_bins)
+        y_idx, y_mask = _bin_indices(y_seq[s], hist_bbox[1], hist_bbox[3],
+                                     y_bins)
+        # Only keep points that are inside the histogram in both directions.
+        mask = x_mask & y_mask
+        flat_idx = x_idx[mask[x_mask]] * y_bins + y_idx[mask[y_mask]]
+        if weights is None:
+            ar += numpy.bincount(flat_idx, minlength=x_bins * y_bins)
+        else:
+            ar += numpy.bincount(flat_idx, weights=weights[s][mask],
+                                 minlength=x_bins * y_bins)
+    return ar.reshape((x_bins, y_bins))
+
+
+def _finite(lx, weights, log):
+    '''Drop non finite values (and non-positive ones if log is True).'''
+    if numpy.issubdtype(lx.dtype, numpy.integer) and not log:
+        return lx, weights
+    with numpy.errstate(invalid='ignore'):
+        mask = numpy.isfinite(lx)
+        if log:
+            mask &= lx > 0
+    if mask.all():
+        return lx, weights
+    if weights is not None:
+        weights = weights[mask]
+    return lx[mask], weights
+
+
+def _offsets(x, m):
+    '''
+    Offsets x - m of integer data (all >= m) as a numpy.intp array, so that
+    numpy.bincount accepts them.
+    '''
+    if numpy.issubdtype(x.dtype, numpy.unsignedinteger):
+        # Exact in the unsigned type (uint64 does not fit in numpy.intp).
+        return (x - x.dtype.type(m)).astype(numpy.intp)
+    # Subtract in numpy.intp, small integer types could overflow.
+    return x.astype(numpy.intp) - m
+
+
+def _chunks(lx, weights, log):
+    '''
+    Split the data in chunks of at most BIN_CHUNK_SIZE values, yield the
+    (lx, weights) tuples with the finite values (see _finite) of each.
+    '''
+    for start in range(0, len(lx), BIN_CHUNK_SIZE):
+        s = slice(start, start + BIN_CHUNK_SIZE)
+        w = None if weights is None else weights[s]
+        yield _finite(lx[s], w, log)
+
+
+def bin_data_1d(lx, n_bins, weights=None, log=False):
+    '''
+    Bin data for a 1d histogram.
+
+    Arguments:
+
+        * `lx` -- Sequence or NumPy array of data, or a .npy file name or
+          raw buffer (see brp.core.columns.open_column).
+        * `n_bins` -- Number of bins.
+        * `weights` -- Optional sequence or NumPy array of weights, one per
+          data point. If not provided every data point counts as 1.
+        * `log` -- Boolean, if True the bins are logarithmically sized (and
+          non-positive data is ignored), default False.
+
+    Returns:
+        A tuple (bin_edges, bin_values) of NumPy arrays, with n_bins + 1 bin
+        edges and n_bins bin values (integer counts or sums of weights).
+
+    Note:
+        The bins are centered on n_bins evenly spaced values, the first one
+        being the minimum and the last one the maximum of the data (so the
+        histogram has half a bin 'overhang' at either end). Non finite data
+        is ignored. Integer data with a small enough range is counted per
+        value with numpy.bincount before being assigned to bins. The data
+        is read in chunks (twice), so memory-mapped data is not loaded
+        into memory as a whole.
+
+    >>> from brp.core.binning import bin_data_1d
+    >>> edges, values = bin_data_1d([0, 1, 1, 2], 3)
+    >>> edges.tolist()
+    [-0.5, 0.5, 1.5, 2.5]
+    >>> values.tolist()
+    [1, 2, 1]
+    >>> import numpy
+    >>> bin_data_1d(numpy.array([1, 5, 7], dtype=numpy.uint64), 3)[1].tolist()
+    [1, 1, 1]
+    '''
+    lx = numpy.asarray(open_column(lx))
+    if weights is not None:
+        weights = numpy.asarray(open_column(weights))
+        assert weights.shape == lx.shape
+
+    # First pass: the range of the (finite) data.
+    m = M = None
+    for x, w in _chunks(lx, weights, log):
+        if not len(x):
+            continue
+        chunk_m = x.min().item()
+        chunk_M = x.max().item()
+        if m is None:
+            m, M = chunk_m, chunk_M
+        else:
+            m = min(m, chunk_m)
+            M = max(M, chunk_M)
+    if m is None:
+        raise ValueError('No (finite) data to bin.')
+
+    integer_fast_path = (numpy.issubdtype(lx.dtype, numpy.integer) and
+                         not log and m != M and
+                         M - m < INTEGER_FAST_PATH_RANGE)
+    if log:
+        m = log10(m)
+        M = log10(M)
+
+    # TODO XXX : remove this hack:
+    if m == M:
+        tmp = abs(m)
+        if tmp > 0:
+            pot = int(log10(tmp))
+            delta = 10 ** (pot - 1)
+        else:  # in case interval[0] == 0
+            delta = 0.1
+        m = m - delta
+        M = M + delta
+
+    interval = (M - m)
+    # n_bins - 1, because you want 0.5 bins 'overhang' at either end of the
+    # histogram.
+    bin_width = interval / (n_bins - 1)
+    bin_edges = m + (numpy.arange(n_bins + 1) - 0.5) * bin_width
+    if log:
+        bin_edges = 10 ** bin_edges
+
+    if integer_fast_path:
+        # Count per distinct value, then assign the values to bins.
+        n_values = M - m + 1
+        if weights is None:
+            per_value = numpy.zeros(n_values, dtype=numpy.int_)
+        else:
+            per_value = numpy.zeros(n_values, dtype=numpy.float64)
+        for x, w in _chunks(lx, weights, log):
+            per_value += numpy.bincount(_offsets(x, m), weights=w,
+                                        minlength=n_values)
+        index = (numpy.arange(n_values) / bin_width).astype(numpy.intp)
+        numpy.minimum(index, n_bins - 1, out=index)
+        bin_values = numpy.bincount(index, weights=per_value,
+                                    minlength=n_bins)
+        if weights is None:
+            bin_values = bin_values.astype(numpy.int_)
+        return bin_edges, bin_values
+
+    if weights is None:
+        bin_values = numpy.zeros(n_bins, dtype=numpy.int_)
+    else:
+        bin_values = numpy.zeros(n_bins, dtype=numpy.float64)
+    for x, w in _chunks(lx, weights, log):
+        if log:
+            x = numpy.log10(x)
+        index = ((x - m) / bin_width).astype(numpy.intp)
+        numpy.minimum(index, n_bins - 1, out=index)
+        bin_values += numpy.bincount(index, weights=w, minlength=n_bins)
+    return bin_edges, bin_values
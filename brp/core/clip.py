@@ -0,0 +1,113 @@
+'''
+Clipping of data against the visible part of a plot.
+'''
+import numpy
+
+# Number of values that are compared at a time by is_sorted.
+SORTED_CHUNK_SIZE = 2 ** 20
+
+
+def sorted_range(x, lower, upper, pad=0):
+    '''
+    Find the slice of x-sorted data that lies within [lower, upper].
+
+    Arguments:
+
+        * `x` -- NumPy array of sorted (non-decreasing) values.
+        * `lower` -- Lower limit.
+        * `upper` -- Upper limit.
+        * `pad` -- Number of extra values to include at either end, use 1 for
+          lines so that the segments entering and leaving are kept.
+
+    >>> import numpy
+    >>> from brp.core.clip import sorted_range
+    >>> sorted_range(numpy.array([0, 1, 2, 3, 4]), 1.5, 3)
+    slice(2, 4, None)
+    '''
+    start = int(x.searchsorted(lower, 'left')) - pad
+    stop = int(x.searchsorted(upper, 'right')) + pad
+    return slice(max(start, 0), min(stop, len(x)))
+
+
+def is_sorted(x):
+    '''Check that the values in the NumPy array x are non-decreasing.'''
+    # In chunks (that overlap by one value), memory-mapped data is then not
+    # read into memory as a whole.
+    for start in range(0, max(len(x) - 1, 0), SORTED_CHUNK_SIZE):
+        chunk = x[start:start + SORTED_CHUNK_SIZE + 1]
+        with numpy.errstate(invalid='ignore'):
+            if not numpy.all(chunk[1:] >= chunk[:-1]):
+                return False
+    return True
+
+
+def clip_polyline(x, y, rect):
+    '''
+    Clip a polyline to a rectangle (Liang-Barsky, for all segments at once).
+
+    Arguments:
+
+        * `x` -- NumPy array of x coordinates of the vertices.
+        * `y` -- NumPy array of y coordinates of the vertices.
+        * `rect` -- Rectangle like (xmin, ymin, xmax, ymax).
+
+    Returns:
+        List of (x, y) tuples of NumPy arrays, one for each visible piece
+        of the polyline. Segments with non finite vertices are left out.
+
+    >>> import numpy
+    >>> from brp.core.clip import clip_polyline
+    >>> pieces = clip_polyline(numpy.array([-1., 1, 3]),
+    ...                        numpy.array([1., 1, 1]), (0, 0, 2, 2))
+    >>> [(px.tolist(), py.tolist()) for px, py in pieces]
+    [([0.0, 1.0, 2.0], [1.0, 1.0, 1.0])]
+    '''
+    xmin, ymin, xmax, ymax = rect
+    if len(x) < 2:
+        with numpy.errstate(invalid='ignore'):
+            inside = ((x >= xmin) & (x <= xmax) & (y >= ymin) &
+                      (y <= ymax))
+        return [(x, y)] if inside.all() and len(x) else []
+
+    x0, y0, x1, y1 = x[:-1], y[:-1], x[1:], y[1:]
+    dx = x1 - x0
+    dy = y1 - y0
+    t0 = numpy.zeros(len(dx))
+    t1 = numpy.ones(len(dx))
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        visible = (numpy.isfinite(x0) & numpy.isfinite(y0) &
+                   numpy.isfinite(x1) & numpy.isfinite(y1))
+        for p, q in ((-dx, x0 - xmin), (dx, xmax - x0),
+                     (-dy, y0 - ymin), (dy, ymax - y0)):
+            r = q / p
+            t0 = numpy.where(p < 0, numpy.maximum(t0, r), t0)
+            t1 = numpy.where(p > 0, numpy.minimum(t1, r), t1)
+            # Parallel to and outside of this edge:
+            visible &= ~((p == 0) & (q < 0))
+        visible &= t0 <= t1
+
+    segments = numpy.flatnonzero(visible)
+    if not len(segments):
+        return []
+    t0 = t0[segments]
+    t1 = t1[segments]
+    x0, y0, dx, dy = x0[segments], y0[segments], dx[segments], dy[segments]
+    # Unclipped ends are taken as is (no rounding errors).
+    start_x = numpy.where(t0 == 0, x0, x0 + t0 * dx)
+    start_y = numpy.where(t0 == 0, y0, y0 + t0 * dy)
+    end_x = numpy.where(t1 == 1, x0 + dx, x0 + t1 * dx)
+    end_y = numpy.where(t1 == 1, y0 + dy, y0 + t1 * dy)
+
+    # A piece continues with the next segment if they share an unclipped
+    # vertex.
+    continues = ((segments[1:] == segments[:-1] + 1) & (t1[:-1] == 1) &
+                 (t0[1:] == 0))
+    starts = numpy.concatenate(([0], numpy.flatnonzero(~continues) + 1))
+    stops = numpy.concatenate((starts[1:], [len(segments)]))
+
+    pieces = []
+    for start, stop in zip(starts.tolist(), stops.tolist()):
+        px = numpy.concatenate((start_x[start:start + 1], end_x[start:stop]))
+        py = numpy.concatenate((start_y[start:start + 1], end_y[start:stop]))
+        pieces.append((px, py))
+    return pieces
@@ -0,0 +1,119 @@
+'''
+Compact storage for the columns of data that plotters keep around.
+
+Numerical columns are stored as contiguous NumPy arrays, columns of (mostly
+repeated) strings like colors and links are stored as a palette of unique
+values plus an array of small integer indices into that palette.
+
+Columns can also live on disk: memory-mapped arrays (and .npy files, which
+are opened memory-mapped) are used as is, so that their data is only read
+when a plot is drawn, and then in chunks.
+'''
+import mmap
+
+import numpy
+
+# Objects that are taken as raw memory holding an array of numbers (other
+# sequences are converted element by element).
+RAW_BUFFER_TYPES = (mmap.mmap, buffer, memoryview)
+
+
+def open_column(seq, dtype=numpy.float64):
+    '''
+    Access a column of data without reading it into memory (if possible).
+
+    Arguments:
+
+        * `seq` -- Name of a .npy file (opened memory-mapped and read-only),
+          a raw buffer like mmap.mmap (interpreted as an array of `dtype`,
+          without copying) or any other sequence (returned as is).
+        * `dtype` -- NumPy data type of the numbers in a raw buffer, default
+          numpy.float64.
+    '''
+    if isinstance(seq, basestring):
+        return numpy.load(seq, mmap_mode='r')
+    if isinstance(seq, RAW_BUFFER_TYPES):
+        return numpy.frombuffer(seq, dtype=dtype)
+    return seq
+
+
+def as_column(seq, dtype=numpy.float64, copy=True):
+    '''
+    Store a sequence of numbers as a contiguous NumPy array.
+
+    Arguments:
+
+        * `seq` -- Sequence of numbers (list, tuple, NumPy array, ...), or
+          a .npy file name or raw buffer (see open_column).
+        * `dtype` -- NumPy data type to store the numbers as, default is
+          numpy.float64 (use numpy.float32 to halve the memory footprint).
+        * `copy` -- Boolean, if False a contiguous array of the right data
+          type is used as is (i.e. it stays owned by the caller), default
+          True.
+
+    Note:
+        Memory-mapped arrays are never copied and keep their own data type
+        (the plotters read them in chunks, converting as they go), nor are
+        raw buffers (the column is a view of the buffer).
+
+    >>> from brp.core.columns import as_column
+    >>> as_column([1, 2, 3]).tolist()
+    [1.0, 2.0, 3.0]
+    '''
+    raw = isinstance(seq, RAW_BUFFER_TYPES)
+    seq = open_column(seq, dtype)
+    if raw or isinstance(seq, numpy.memmap):
+        return seq
+    if copy:
+        return numpy.array(seq, dtype=dtype)
+    return numpy.ascontiguousarray(seq, dtype=dtype)
+
+
+class IndexedColumn(object):
+    '''
+    Column of values stored as a palette of unique values plus indices.
+
+    Supports len(), indexing and iteration like the list it replaces.
+
+    >>> from brp.core.columns import IndexedColumn
+    >>> c = IndexedColumn(['red', 'blue', 'red'])
+    >>> c[2]
+    'red'
+    >>> c.palette
+    ['blue', 'red']
+    >>> len(c)
+    3
+    '''
+    def __init__(self, values=()):
+        if isinstance(values, IndexedColumn):
+            self.palette = list(values.palette)
+            self.indices = values.indices.copy()
+            return
+
+        if len(values):
+            palette, indices = numpy.unique(numpy.asarray(values),
+                                            return_inverse=True)
+            self.palette = palette.tolist()
+        else:
+            indices = numpy.zeros(0, dtype=numpy.intp)
+            self.palette = []
+        self.indices = indices.astype(
+            numpy.min_scalar_type(max(len(self.palette) - 1, 0)))
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, key):
+        return self.palette[self.indices[key]]
+
+    def __iter__(self):
+        palette = self.palette
+        for i in self.indices:
+            yield palette[i]
+
+    def take(self, key):
+        '''Select values (by index array or slice) as a new IndexedColumn.'''
+        selection = IndexedColumn()
+        selection.palette = self.palette
+        selection.indices = self.indices[key]
+        return selection
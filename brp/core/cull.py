@@ -0,0 +1,48 @@
+'''
+Removal of data points that are hidden below identical data points.
+
+In busy scatter plots many data points end up at (nearly) the same screen
+position with the same symbol and color. Only the last one drawn is
+visible, the others can be left out of the SVG.
+'''
+import numpy
+
+
+def overplot_indices(screen, exact=(), grid=1, keep=None):
+    '''
+    Find the data points that are not hidden below an identical data point.
+
+    Arguments:
+
+        * `screen` -- Sequence of NumPy arrays of screen coordinates, these
+          are quantized to cells of 1 / `grid` pixel.
+        * `exact` -- Sequence of NumPy arrays of other properties that
+          determine what a data point looks like (color, symbol parameters),
+          these have to be equal for data points to be identical.
+        * `grid` -- Number of cells per pixel in each direction, default 1.
+        * `keep` -- Optional NumPy boolean array, data points for which it
+          is True are always kept (for instance those carrying a link).
+
+    Returns:
+        Sorted NumPy array with the indices of the data points to draw.
+
+    Note:
+        Of a group of identical data points the last one is kept, because
+        it is drawn on top.
+
+    >>> from brp.core.cull import overplot_indices
+    >>> overplot_indices([[0.1, 0.2, 5.0, 0.3], [1.0, 1.1, 1.0, 1.2]]).tolist()
+    [2, 3]
+    '''
+    n = len(screen[0])
+    columns = [numpy.floor(numpy.asarray(c, dtype=numpy.float64) * grid)
+               for c in screen]
+    columns.extend(numpy.asarray(c, dtype=numpy.float64) for c in exact)
+    # Adding 0.0 turns -0.0 into 0.0 (they should be the same key).
+    table = numpy.column_stack(columns) + 0.0
+    # Reversed, so that numpy.unique finds the last of identical points.
+    tmp, first = numpy.unique(table[::-1], axis=0, return_index=True)
+    indices = n - 1 - first
+    if keep is not None:
+        indices = numpy.union1d(indices, numpy.flatnonzero(keep))
+    return numpy.sort(indices)
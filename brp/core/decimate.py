@@ -0,0 +1,69 @@
+'''
+Decimation of line data that is denser than the pixels it is drawn on.
+
+The M4 scheme keeps, for every pixel column, the first, minimum, maximum
+and last sample that falls in that column. Drawing the remaining samples
+as a line gives the same pixels as drawing all of them.
+'''
+import numpy
+
+
+def m4_indices(tx, ty):
+    '''
+    Find the indices of the samples to keep for M4 decimation.
+
+    Arguments:
+
+        * `tx` -- NumPy array of transformed (screen) x coordinates.
+        * `ty` -- NumPy array of transformed (screen) y coordinates.
+
+    Returns:
+        Sorted NumPy array of indices into `tx` and `ty`.
+
+    Note:
+        A pixel column is every unit interval of `tx`. Consecutive samples
+        in the same pixel column form a run, each run is reduced to at most
+        four samples. For x-sorted data there is one run per pixel column.
+        Samples with non finite coordinates break the line, runs end there
+        and one such sample is kept for every gap between finite samples
+        (so that the line stays broken).
+
+    >>> import numpy
+    >>> from brp.core.decimate import m4_indices
+    >>> tx = numpy.array([0.1, 0.2, 0.3, 0.4, 0.5, 1.5])
+    >>> ty = numpy.array([5.0, 1.0, 9.0, 4.0, 3.0, 2.0])
+    >>> m4_indices(tx, ty).tolist()
+    [0, 1, 2, 4, 5]
+    >>> ty[2:4] = numpy.nan
+    >>> m4_indices(tx, ty).tolist()
+    [0, 1, 2, 4, 5]
+    '''
+    tx = numpy.asarray(tx)
+    ty = numpy.asarray(ty)
+    with numpy.errstate(invalid='ignore'):
+        finite = numpy.flatnonzero(numpy.isfinite(tx) & numpy.isfinite(ty))
+    if len(finite) == 0:
+        return finite
+    x = tx[finite]
+    y = ty[finite]
+
+    columns = numpy.floor(x)
+    # Non finite samples between two finite ones (a gap in the line).
+    gaps = numpy.diff(finite) > 1
+    breaks = (numpy.diff(columns) != 0) | gaps
+    starts = numpy.concatenate(([0], numpy.flatnonzero(breaks) + 1))
+    counts = numpy.diff(numpy.concatenate((starts, [len(x)])))
+    run = numpy.repeat(numpy.arange(len(starts)), counts)
+
+    keep = [starts, starts + counts - 1]
+    for reduce_func in (numpy.minimum, numpy.maximum):
+        extremes = reduce_func.reduceat(y, starts)
+        # First sample of each run that attains the run's extreme value.
+        hits = numpy.flatnonzero(y == extremes[run])
+        first_hits = numpy.concatenate(([True], run[hits][1:] !=
+                                        run[hits][:-1]))
+        keep.append(hits[first_hits])
+    kept = finite[numpy.unique(numpy.concatenate(keep))]
+    # The first non finite sample of each gap.
+    sentinels = finite[:-1][gaps] + 1
+    return numpy.union1d(kept, sentinels)
@@ -8,6 +8,125 @@ assumes that there is a separate transform for the X axis and the Y axis.
 from __future__ import division
 from math import log10
 
+import numpy
+
+
+class LinearTransform(object):
+    '''
+    Linear transform x -> (x - in_shift) * scale + out_shift .
+
+    Instances are callable with a single number or with a sequence/NumPy array
+    of numbers, in the latter case the whole array is transformed in one
+    vectorized call and a NumPy array is returned.
+
+    >>> from brp.core.transform import LinearTransform
+    >>> t = LinearTransform(2, 1, 0)
+    >>> t(3)
+    4.0
+    >>> t([1, 2, 3]).tolist()
+    [0.0, 2.0, 4.0]
+    >>> t.inverse()(4)
+    3.0
+    >>> t.coefficients
+    (2.0, -2.0)
+    '''
+    log = False
+
+    def __init__(self, scale, in_shift, out_shift):
+        self.scale = float(scale)
+        self.in_shift = in_shift
+        self.out_shift = out_shift
+
+    @property
+    def coefficients(self):
+        '''Coefficients (a, b) such that transform is x -> a * x + b'''
+        return self.scale, self.out_shift - self.in_shift * self.scale
+
+    def __call__(self, x):
+        if numpy.ndim(x) == 0:
+            return (x - self.in_shift) * self.scale + self.out_shift
+        x = numpy.asarray(x, dtype=numpy.float64)
+        return (x - self.in_shift) * self.scale + self.out_shift
+
+    def inverse(self):
+        '''Return the inverse of this transform.'''
+        return LinearTransform(1 / self.scale, self.out_shift, self.in_shift)
+
+
+class LogTransform(object):
+    '''
+    Logarithmic transform x -> (log10(x) - log10(in_shift)) * scale + out_shift
+
+    Like LinearTransform instances are callable with numbers or arrays. For a
+    single number a ValueError is raised if it is not positive, for arrays the
+    non-positive entries are transformed to NaN.
+
+    >>> from brp.core.transform import LogTransform
+    >>> t = LogTransform(1, 1, 0)
+    >>> t(100)
+    2.0
+    >>> t([1, 10, 100]).tolist()
+    [0.0, 1.0, 2.0]
+    >>> t.inverse()(2)
+    100.0
+    '''
+    log = True
+
+    def __init__(self, scale, in_shift, out_shift):
+        self.scale = float(scale)
+        self.in_shift = in_shift
+        self.out_shift = out_shift
+        self.log_in_shift = log10(in_shift)
+
+    @property
+    def coefficients(self):
+        '''Coefficients (a, b) such that transform is x -> a * log10(x) + b'''
+        return self.scale, self.out_shift - self.log_in_shift * self.scale
+
+    def __call__(self, x):
+        if numpy.ndim(x) == 0:
+            return (log10(x) - self.log_in_shift) * self.scale + self.out_shift
+        x = numpy.asarray(x, dtype=numpy.float64)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            tmp = numpy.log10(x)
+            tmp[x <= 0] = numpy.nan
+        return (tmp - self.log_in_shift) * self.scale + self.out_shift
+
+    def inverse(self):
+        '''Return the inverse of this transform.'''
+        return ExpTransform(1 / self.scale, self.out_shift, self.log_in_shift)
+
+
+class ExpTransform(object):
+    '''
+    Exponential transform x -> 10 ** ((x - in_shift) * scale + out_shift) .
+
+    This is the inverse of LogTransform, instances are callable with numbers
+    or arrays.
+    '''
+    log = False
+
+    def __init__(self, scale, in_shift, out_shift):
+        self.scale = float(scale)
+        self.in_shift = in_shift
+        self.out_shift = out_shift
+
+    @property
+    def coefficients(self):
+        '''Coefficients (a, b) such that transform is x -> 10 ** (a * x + b)'''
+        return self.scale, self.out_shift - self.in_shift * self.scale
+
+    def __call__(self, x):
+        if numpy.ndim(x) == 0:
+            return 10 ** ((x - self.in_shift) * self.scale + self.out_shift)
+        x = numpy.asarray(x, dtype=numpy.float64)
+        return 10 ** ((x - self.in_shift) * self.scale + self.out_shift)
+
+    def inverse(self):
+        '''Return the inverse of this transform.'''
+        return LogTransform(1 / self.scale, 10 ** self.out_shift,
+                            self.in_shift)
+
 
 def setup_transform_1d(interval, target_interval, log=False):
     '''
@@ -20,7 +139,8 @@ def setup_transform_1d(interval, target_interval, log=False):
         * `log` --- Boolean, True if data should be plot logarithmically.
 
     Returns:
-        A transformation function.
+        A transformation, a callable LinearTransform or LogTransform instance
+        that accepts both numbers and arrays.
 
     >>> from brp.core.transform import setup_transform_1d
     >>> setup_transform_1d([0, 10], [0, 10], False)(7)
@@ -49,8 +169,7 @@ def setup_transform_1d(interval, target_interval, log=False):
         in_shift = interval[0]
         out_shift = target_interval[0]
 
-        def transform(x):
-            return (log10(x) - log10(in_shift)) * scale + out_shift
+        transform = LogTransform(scale, in_shift, out_shift)
 
     else:  # Normal 'linear' transform.
         if interval[1] - interval[0] == 0:
@@ -66,8 +185,7 @@ def setup_transform_1d(interval, target_interval, log=False):
         in_shift = interval[0]
         out_shift = target_interval[0]
 
-        def transform(x):
-            return (x - in_shift) * scale + out_shift
+        transform = LinearTransform(scale, in_shift, out_shift)
 
     return transform
 
@@ -88,7 +206,8 @@ def setup_transforms(bbox, target_bbox, x_log=False, y_log=False):
           logarithmically, default False.
 
     Returns :
-        Two transformation function (one for x-data, one for y-data).
+        Two transformations (one for x-data, one for y-data), see
+        setup_transform_1d.
 
     >>> from brp.core.transform import setup_transforms
     >>> fx, fy = setup_transforms([0, 0, 10, 10], [0, 0, 10, 10])
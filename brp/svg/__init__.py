@@ -1 +1 @@
-__all__ = ['base', 'constants', 'plotters']
+__all__ = ['base', 'constants', 'plotters', 'stream']
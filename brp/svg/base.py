@@ -3,18 +3,28 @@ Code that deals with the basics of SVG generation
 '''
 from __future__ import division
 from xml.sax.saxutils import escape
+from contextlib import contextmanager
+import gzip
+import StringIO
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 
 from brp.svg.plotters.axes import LeftAxisPlotter
 from brp.svg.plotters.axes import BottomAxisPlotter
 from brp.svg.plotters.axes import TopAxisPlotter
 from brp.svg.plotters.axes import RightAxisPlotter
 from brp.svg.plotters.base import BasePlotter
+from brp.svg.plotters.symbol import set_instance_prefix
 
 from brp.core.bbox import stretch_bbox, check_bbox_intervals
 from brp.core.transform import setup_transforms
 from brp.core.exceptions import NotImplementedError
 
 from brp.svg.et_import import ET
+from brp.svg.stream import SVGStreamWriter
+from brp.svg.budget import RasterDecision, apply_budget
+from brp.svg.encoder import PathEncoder, DEFAULT_ENCODER
+from brp.svg.profile import Profiler, measure, timed
 from brp.svg.constants import AXIS_SIZE, FONT_SIZE, DATA_PADDING
 
 
@@ -27,11 +37,30 @@ class SVGCanvas(object):
             * `width` --- Width of SVG image in screen coordinates.
             * `height` --- Height of SVG image in screen coordinates.
 
+        Keyword arguments :
+
+            * `element_budget` --- Integer, maximum number of SVG elements
+              for the whole canvas. Plot layers added in automatic mode are
+              rasterized (largest first) when the estimated total is over
+              budget. Default None (no maximum).
+            * `byte_budget` --- Integer, maximum number of bytes of SVG for
+              the whole canvas, used like `element_budget`. Default None.
+            * `precision` --- Integer, number of decimals for the coordinates
+              of lines, histograms and axes. Default 2.
+            * `integer_coordinates` --- Boolean, if True these coordinates
+              are written as integers (in units of 10 ** -precision) and the
+              paths are scaled back with a transform. Default False.
         '''
         self.width = width
         self.height = height
         self.containers = []
         self.background_color = kwargs.get('background_color', 'none')
+        self.element_budget = kwargs.get('element_budget', None)
+        self.byte_budget = kwargs.get('byte_budget', None)
+        # List of brp.svg.budget.RasterDecision, filled in by draw().
+        self.raster_report = []
+        self.encoder = PathEncoder(kwargs.get('precision', 2),
+                                   kwargs.get('integer_coordinates', False))
 
     def add_plot_container(self, plot_container):
         '''
@@ -58,7 +87,8 @@ class SVGCanvas(object):
         else:
             raise Exception('This cannot be added to an SVGCanvas.')
 
-    def draw(self, file):
+    def draw(self, file, streaming=False, processes=1, raster_threads=1,
+             compression=None, profiler=None):
         '''
         Draw all plot.
 
@@ -66,7 +96,45 @@ class SVGCanvas(object):
 
             * `file` --- File like object that receives the plot.
 
+        Keyword arguments :
+
+            * `streaming` --- Boolean, if True the SVG is written to `file`
+              layer by layer and the ElementTree Elements are dropped after
+              they are written. Peak memory then scales with the largest
+              plot layer instead of with the whole canvas. Default False.
+            * `processes` --- Integer, number of worker processes that draw
+              the PlotContainers in parallel, None for one per CPU. Default
+              1 (draw everything in this process). The output does not
+              depend on the number of processes.
+            * `raster_threads` --- Integer, number of threads per
+              PlotContainer that draw the rasterized plot layers (see
+              PlotContainer.draw). Default 1.
+            * `compression` --- Integer gzip compression level (1 fastest,
+              9 smallest) to write compressed SVG (.svgz) to `file`, the SVG
+              is compressed as it is written. Default None (no compression).
+            * `profiler` --- Optional brp.svg.profile.Profiler that records
+              the time spent on each plot layer (and in which phase), the
+              number of elements and bytes it produced and optionally the
+              peak memory use. With a profiler the SVG is written layer by
+              layer (as with `streaming`), so that the serialization it
+              measures is the one that is written. Default None (no
+              profiling).
+
+        Note: with more than one process the PlotContainers (and their
+        data) are pickled and sent to the worker processes, on platforms
+        without fork() the calling script needs an `if __name__ ==
+        '__main__':` guard (see the multiprocessing documentation).
         '''
+        if compression is not None:
+            # The file name is not stored, `file` itself is not closed.
+            compressed = gzip.GzipFile('', 'wb', compression, file)
+            try:
+                self.draw(compressed, streaming, processes, raster_threads,
+                          profiler=profiler)
+            finally:
+                compressed.close()
+            return
+
         root = ET.Element('svg')
         root.set('xmlns', 'http://www.w3.org/2000/svg')
         root.set('xmlns:xlink', 'http://www.w3.org/1999/xlink')
@@ -82,11 +150,134 @@ class SVGCanvas(object):
         rect.set('height', '%.2f' % self.height)
         rect.set('fill', self.background_color)
 
-        for c in self.containers:
-            c.draw(root)
+        # Decide which plot layers are rasterized, first per PlotContainer
+        # then for the canvas as a whole.
+        plans = {}
+        self.raster_report = []
+        with timed(profiler, 'plan_raster'):
+            for c in self.containers:
+                if isinstance(c, PlotContainer):
+                    plans[id(c)] = c.plan_raster()
+                    self.raster_report.extend(plans[id(c)])
+            apply_budget(self.raster_report, self.element_budget,
+                         self.byte_budget, 'canvas')
+
+        if processes != 1:
+            self._draw_parallel(root, file, plans, processes, raster_threads,
+                                profiler)
+        elif streaming or profiler is not None:
+            stream = SVGStreamWriter(file)
+            stream.start(root)
+            stream.flush(root)
+            for i, c in enumerate(self.containers):
+                if isinstance(c, PlotContainer):
+                    if profiler is not None:
+                        profiler.container = i
+                    with _instance_scope(i):
+                        c.draw(root, stream, plans[id(c)], self.encoder,
+                               raster_threads, profiler)
+                else:
+                    c.draw(root, stream)
+                stream.flush(root)
+            stream.end()
+        else:
+            for i, c in enumerate(self.containers):
+                if isinstance(c, PlotContainer):
+                    if profiler is not None:
+                        profiler.container = i
+                    with _instance_scope(i):
+                        c.draw(root, raster_plan=plans[id(c)],
+                               encoder=self.encoder,
+                               raster_threads=raster_threads,
+                               profiler=profiler)
+                else:
+                    c.draw(root)
+
+            tree = ET.ElementTree(root)
+            tree.write(file)
+
+    def _draw_parallel(self, root, file, plans, processes, raster_threads,
+                       profiler):
+        '''
+        Draw the PlotContainers in worker processes, write them in order.
+        '''
+        stream = SVGStreamWriter(file)
+        stream.start(root)
+        stream.flush(root)
+        # The workers profile with a Profiler of their own.
+        memory = None if profiler is None else profiler.memory
+        jobs = [(i, c, plans[id(c)], self.encoder, raster_threads, memory)
+                for i, c in enumerate(self.containers)
+                if isinstance(c, PlotContainer)]
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.imap(_draw_container, jobs)
+            for c in self.containers:
+                if isinstance(c, PlotContainer):
+                    svg, drawn_plan, records = next(results)
+                    stream.write_serialized(svg)
+                    if profiler is not None:
+                        profiler.add(records)
+                    # The workers drew copies, copy back what they decided.
+                    for decision, drawn in zip(plans[id(c)], drawn_plan):
+                        decision.raster = drawn.raster
+                        decision.reason = drawn.reason
+                    c.raster_report = plans[id(c)]
+                else:
+                    c.draw(root, stream)
+                    stream.flush(root)
+        finally:
+            pool.terminate()
+            pool.join()
+        stream.end()
+
+
+@contextmanager
+def _instance_scope(index):
+    '''
+    Number the symbol definitions of the PlotContainer at `index` on an
+    SVGCanvas separately, so that they do not depend on what was drawn
+    before (or in which process).
+    '''
+    previous = set_instance_prefix('bs%d_' % index)
+    try:
+        yield
+    finally:
+        set_instance_prefix(*previous)
+
+
+def _draw_container(job):
+    '''
+    Draw one PlotContainer of an SVGCanvas (in a worker process).
+
+    Arguments :
+
+        * `job` --- Tuple (index, plot_container, raster_plan, encoder,
+          raster_threads, memory), memory is None if there is no profiling
+          otherwise see Profiler.
 
-        tree = ET.ElementTree(root)
-        tree.write(file)
+    Returns a tuple (svg, raster_plan, layer_profiles) with the serialized
+    SVG elements of the PlotContainer, its raster plan as updated while
+    drawing and a list of brp.svg.profile.LayerProfile (empty if there is
+    no profiling).
+    '''
+    index, container, raster_plan, encoder, raster_threads, memory = job
+    profiler = None
+    if memory is not None:
+        profiler = Profiler(memory=memory)
+        profiler.container = index
+    # The plot layers are serialized as they are drawn (once, also when
+    # profiling).
+    svg = StringIO.StringIO()
+    stream = SVGStreamWriter(svg)
+    scratch = ET.Element('g')
+    with _instance_scope(index):
+        container.draw(scratch, stream, raster_plan=raster_plan,
+                       encoder=encoder, raster_threads=raster_threads,
+                       profiler=profiler)
+    stream.flush(scratch)
+    records = [] if profiler is None else profiler.layers
+    return svg.getvalue(), raster_plan, records
 
 
 class PlotContainer(object):
@@ -94,6 +285,11 @@ class PlotContainer(object):
     Complete plot (axes + drawing).
 
     Keeps state and acts as a container for BasePlotter sub-classes.
+
+    The plotters cache the bounding boxes of their data, so drawing again
+    does not go through unchanged data. Data changed in place is only seen
+    after calling data_changed on its plotter (replacing it with set_data
+    does that).
     '''
     def __init__(self, x_offset, y_offset, width, height, **kwargs):
         '''
@@ -116,6 +312,16 @@ class PlotContainer(object):
               minimum range of the x axis (the horizontal axis)
             * `y_min_range` --- tuple of floats (or integers) giving the
               minimum range of the y axis (the vertical axis)
+            * `x_range` --- tuple of floats (or integers) giving the exact
+              range of the x axis, data outside of it is clipped.
+            * `y_range` --- tuple of floats (or integers) giving the exact
+              range of the y axis, data outside of it is clipped.
+            * `element_budget` --- Integer, maximum number of SVG elements
+              for this plot. Plot layers added in automatic mode are
+              rasterized (largest first) when the estimated total is over
+              budget. Default None (no maximum).
+            * `byte_budget` --- Integer, maximum number of bytes of SVG for
+              this plot, used like `element_budget`. Default None.
         '''
         self.update_svg_bbox(x_offset, y_offset, width, height)
         self.data_bbox = None
@@ -137,8 +343,14 @@ class PlotContainer(object):
         self.draw_axes = True
         self.x_min_range = kwargs.get('x_min_range', None)
         self.y_min_range = kwargs.get('y_min_range', None)
+        self.x_range = kwargs.get('x_range', None)
+        self.y_range = kwargs.get('y_range', None)
 
         self.raster_fallback = kwargs.get('raster', False)
+        self.element_budget = kwargs.get('element_budget', None)
+        self.byte_budget = kwargs.get('byte_budget', None)
+        # List of brp.svg.budget.RasterDecision, filled in by draw().
+        self.raster_report = []
 
     def update_svg_bbox(self, x_offset, y_offset, width, height):
         '''
@@ -147,35 +359,93 @@ class PlotContainer(object):
         self.svg_bbox = [x_offset, y_offset, x_offset + width,
                          y_offset + height]
 
-    def add_plotter(self, plotter, raster=False):
+    def add_plotter(self, plotter, raster=None):
         '''
         Add a BasePlotter sub-class instance to this PlotContainer.
 
         Note: Only here for backwards compatability, use .add() method instead.
         '''
-        self.plot_layers.append((plotter, raster))
+        self.add(plotter, raster)
 
-    def add(self, plotter, raster=False):
+    def add(self, plotter, raster=None):
         '''
         Add a BasePlotter sub-class instance to this PlotContainer.
+
+        Arguments :
+
+            * `plotter` --- BasePlotter sub-class instance.
+            * `raster` --- True to draw the rasterized fallback, False to
+              draw SVG elements, None (default) to draw SVG elements unless
+              the element or byte budget is exceeded.
         '''
         if isinstance(plotter, BasePlotter):
             self.plot_layers.append((plotter, raster))
         else:
             raise Exception('This cannot be added to a PlotContainer.')
 
-    def draw(self, root_element):
-        '''Draw this PlotContainer.'''
-        # Add the *AxisPlotter to the plot_layers
+    def plan_raster(self):
+        '''
+        Decide which plot layers are rasterized given the budgets.
+
+        Returns:
+            List of brp.svg.budget.RasterDecision, one per plot layer.
+        '''
+        plan = [RasterDecision(p, raster) for p, raster in self.plot_layers]
+        apply_budget(plan, self.element_budget, self.byte_budget, 'panel')
+        return plan
+
+    def draw(self, root_element, stream=None, raster_plan=None,
+             encoder=DEFAULT_ENCODER, raster_threads=1, profiler=None):
+        '''
+        Draw this PlotContainer.
+
+        Arguments :
+
+            * `root_element` --- ElementTree Element that receives the plot.
+            * `stream` --- Optional brp.svg.stream.SVGStreamWriter, if
+              provided the children of `root_element` are written out and
+              removed after each plot layer is drawn.
+            * `raster_plan` --- Optional list of RasterDecision as returned
+              by plan_raster, by default plan_raster is called.
+            * `encoder` --- brp.svg.encoder.PathEncoder for line geometry,
+              normally that of the SVGCanvas.
+            * `raster_threads` --- Integer, number of threads that draw the
+              rasterized plot layers (and layers that draw images, see
+              BasePlotter.raster_output) while the other layers are drawn,
+              None for one per CPU. Default 1 (no threads). The output does
+              not depend on the number of threads.
+            * `profiler` --- Optional brp.svg.profile.Profiler, see
+              SVGCanvas.draw.
+        '''
+        if raster_plan is None:
+            raster_plan = self.plan_raster()
+        self.raster_report = raster_plan
+
+        # The plot layers followed by the *AxisPlotters.
+        layers = list(self.plot_layers)
         if self.draw_axes:
-            self.plot_layers.append((self.top, False))
-            self.plot_layers.append((self.right, False))
-            self.plot_layers.append((self.left, False))
-            self.plot_layers.append((self.bottom, False))
-
-        # Find the boundingbox that contains all data.
-        for plotter, use_raster_fallback in self.plot_layers:
-            self.data_bbox = plotter.prepare_bbox(self.data_bbox)
+            layers.extend([(self.top, False), (self.right, False),
+                           (self.left, False), (self.bottom, False)])
+        if profiler is None:
+            records = [None] * len(layers)
+        else:
+            records = [profiler.layer(i, plotter)
+                       for i, (plotter, raster) in enumerate(layers)]
+
+        # Find the boundingbox that contains all data (not needed if the
+        # ranges of both axes are set). The plotters cache the bounding box
+        # of their data, so this only goes through data that is new.
+        for (plotter, use_raster_fallback), record in zip(layers, records):
+            plotter.prepare_axes(self.x_log, self.y_log)
+            plotter.set_encoder(encoder)
+            if self.x_range is None or self.y_range is None:
+                with measure(record, 'prepare_bbox'):
+                    self.data_bbox = plotter.prepare_bbox(self.data_bbox)
+        # Without any (finite) data fall back to the minimum ranges.
+        if self.data_bbox is None:
+            x_range = self.x_min_range or (1, 1)
+            y_range = self.y_min_range or (1, 1)
+            self.data_bbox = (x_range[0], y_range[0], x_range[1], y_range[1])
         # If required, set the range of the x and y axes to some minimum.
         if self.x_min_range is not None:
             tmp = list(self.data_bbox)
@@ -187,6 +457,16 @@ class PlotContainer(object):
             tmp[1] = min(tmp[1], self.y_min_range[0])
             tmp[3] = max(tmp[3], self.y_min_range[1])
             self.data_bbox = tuple(tmp)
+        # If required, set the range of the x and y axes exactly (the
+        # plotters clip their data to the resulting bounding box).
+        if self.x_range is not None:
+            tmp = list(self.data_bbox)
+            tmp[0], tmp[2] = self.x_range
+            self.data_bbox = tuple(tmp)
+        if self.y_range is not None:
+            tmp = list(self.data_bbox)
+            tmp[1], tmp[3] = self.y_range
+            self.data_bbox = tuple(tmp)
         # Check that each of the axis covers some range and if not make it so.
         self.data_bbox = check_bbox_intervals(self.data_bbox, self.x_log,
                                               self.y_log)
@@ -206,8 +486,9 @@ class PlotContainer(object):
 
         # Comunicate to each *Plotter object the data bounding box and the
         # SVG plot bounding box.
-        for plotter, use_raster_fallback in self.plot_layers:
-            plotter.done_bbox(self.data_bbox, self.svg_bbox)
+        for (plotter, use_raster_fallback), record in zip(layers, records):
+            with measure(record, 'done_bbox'):
+                plotter.done_bbox(self.data_bbox, self.svg_bbox)
 
         # Check that all the required to construct the transforms is available
         if not (self.svg_bbox and self.data_bbox):
@@ -239,33 +520,59 @@ class PlotContainer(object):
                           width='%.2f' % (svg_x_max - svg_x_min - 2 * AXIS_SIZE),
                           height='%.2f' % (svg_y_max - svg_y_min - 2 * AXIS_SIZE))
 
-        # Draw all the parts of the plot.
-        for p_layer, use_raster_fallback in self.plot_layers:
-            if use_raster_fallback:
-                # find appropriate transforms, i.e. starting at (0, 0)
-                # going to width, height
-                # XXX TODO: check for off-by-ones!!!!
-                img_width = svg_target_bbox[2] - svg_target_bbox[0]
-                img_height = abs(svg_target_bbox[3] - svg_target_bbox[1])
-                assert img_width > 0
-                assert img_height > 0
-                img_bbox = [0, img_height, img_width, 0]
-                # Add explicit check for logarithmic axes, if present
-                # blow up for now. (maybe?)
-                xtr2, ytr2 = setup_transforms(self.data_bbox, img_bbox,
-                    x_log=self.top.kwargs['log'] or self.bottom.kwargs['log'],
-                    y_log=self.left.kwargs['log'] or self.right.kwargs['log']
-                )
-                try:
-                    p_layer.rdraw(root_element, xtr2, ytr2, svg_target_bbox)
-                except NotImplementedError:
-                    p_layer.draw(root_element, xtr, ytr)
-            else:
-                p_layer.draw(root_element, xtr, ytr)
+        # Draw all the parts of the plot. Each plot layer is drawn into a
+        # scratch element, layers that render images can be drawn by a
+        # thread pool. The scratch elements are moved to root_element in
+        # the order of the plot layers as soon as they are done.
+        decisions = raster_plan + [None] * (len(layers) - len(raster_plan))
+        pool = None
+        if raster_threads != 1:
+            pool = ThreadPool(raster_threads)
+        xtr2 = ytr2 = None
+        slots = []
+        try:
+            for (p_layer, requested), decision, record in zip(layers,
+                                                              decisions,
+                                                              records):
+                if decision is not None and decision.raster:
+                    if xtr2 is None:
+                        # find appropriate transforms, i.e. starting at
+                        # (0, 0) going to width, height
+                        # XXX TODO: check for off-by-ones!!!!
+                        img_width = svg_target_bbox[2] - svg_target_bbox[0]
+                        img_height = abs(svg_target_bbox[3] -
+                                         svg_target_bbox[1])
+                        assert img_width > 0
+                        assert img_height > 0
+                        img_bbox = [0, img_height, img_width, 0]
+                        # Add explicit check for logarithmic axes, if present
+                        # blow up for now. (maybe?)
+                        xtr2, ytr2 = setup_transforms(self.data_bbox,
+                            img_bbox,
+                            x_log=(self.top.kwargs['log'] or
+                                   self.bottom.kwargs['log']),
+                            y_log=(self.left.kwargs['log'] or
+                                   self.right.kwargs['log'])
+                        )
+                    args = (_rdraw_layer, (p_layer, xtr2, ytr2,
+                                           svg_target_bbox, record))
+                else:
+                    args = (_draw_layer, (p_layer, xtr, ytr, record))
+                if pool is not None and (args[0] is _rdraw_layer or
+                                         p_layer.raster_output):
+                    result = pool.apply_async(*args)
+                else:
+                    result = args[0](*args[1])
+                slots.append((p_layer, decision, result, record))
+                self._add_layers(slots, root_element, stream, xtr, ytr,
+                                 profiler)
+            self._add_layers(slots, root_element, stream, xtr, ytr,
+                             profiler, True)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
 
-        # Remove the *AxisPlotters from the parts of the plot again.
-        if self.draw_axes:
-            self.plot_layers = self.plot_layers[0:-4]
         self.data_bbox = None
 
         if False:
@@ -279,6 +586,60 @@ class PlotContainer(object):
             rect.set('stroke', 'blue')
             rect.set('fill', 'none')
 
+    def _add_layers(self, slots, root_element, stream, x_transform,
+                    y_transform, profiler, wait=False):
+        '''
+        Move the drawn plot layers at the start of `slots` to root_element.
+
+        Arguments :
+
+            * `slots` --- List of (plotter, raster_decision, result,
+              layer_profile) tuples in drawing order, result is the scratch
+              element, None if the plotter has no rasterized fallback or an
+              AsyncResult if it is still being drawn. Handled slots are
+              removed from the list.
+            * `root_element` --- ElementTree Element that receives the plot.
+            * `stream` --- Optional brp.svg.stream.SVGStreamWriter.
+            * `x_transform`, `y_transform` --- Transforms for drawing the
+              plot layers that turned out to have no rasterized fallback.
+            * `profiler` --- Optional brp.svg.profile.Profiler.
+            * `wait` --- Boolean, if True wait for all slots to be drawn.
+        '''
+        while slots:
+            p_layer, decision, result, record = slots[0]
+            if result is not None and not hasattr(result, 'tag'):
+                if not (wait or result.ready()):
+                    break
+                result = result.get()
+            if result is None:
+                decision.raster = False
+                decision.reason = 'no rasterized fallback'
+                result = _draw_layer(p_layer, x_transform, y_transform,
+                                     record)
+            if record is None:
+                for child in result:
+                    root_element.append(child)
+                if stream is not None:
+                    stream.flush(root_element)
+            else:
+                record.raster = decision is not None and decision.raster
+                record.n_elements = sum(len(child.findall('.//*')) + 1
+                                        for child in result)
+                if stream is not None:
+                    with measure(record, 'serialize'):
+                        svg = ''.join(ET.tostring(child) for child in result)
+                    record.n_bytes = len(svg)
+                    # Write what came before, then the serialized layer.
+                    stream.flush(root_element)
+                    stream.write_serialized(svg)
+                else:
+                    # Serialized later on by the caller (not measured).
+                    record.n_bytes = None
+                    for child in result:
+                        root_element.append(child)
+                profiler.done(record)
+            del slots[0]
+
     def set_minimum_data_bbox(self, bbox):
         self.set_minimum_x_range(bbox[0], bbox[2])
         self.set_minimum_y_range(bbox[1], bbox[3])
@@ -289,10 +650,40 @@ class PlotContainer(object):
     def set_minimum_y_range(self, min_y, max_y):
         self.y_min_range = (min_y, max_y)
 
+    def set_x_range(self, min_x, max_x):
+        '''Set the range of the x axis, data outside of it is clipped.'''
+        self.x_range = (min_x, max_x)
+
+    def set_y_range(self, min_y, max_y):
+        '''Set the range of the y axis, data outside of it is clipped.'''
+        self.y_range = (min_y, max_y)
+
     def hide_axes(self):
         self.draw_axes = False
 
 
+def _draw_layer(plotter, x_transform, y_transform, record=None):
+    '''Draw a plot layer into a new (scratch) element.'''
+    scratch = ET.Element('g')
+    with measure(record, 'draw'):
+        plotter.draw(scratch, x_transform, y_transform)
+    return scratch
+
+
+def _rdraw_layer(plotter, x_transform, y_transform, svg_bbox, record=None):
+    '''
+    Draw the rasterized fallback of a plot layer into a new (scratch)
+    element, return None if the plot layer has no rasterized fallback.
+    '''
+    scratch = ET.Element('g')
+    try:
+        with measure(record, 'rdraw'):
+            plotter.rdraw(scratch, x_transform, y_transform, svg_bbox)
+    except NotImplementedError:
+        return None
+    return scratch
+
+
 class TextFragment(object):
     def __init__(self, x, y, text, color='black', alignment='start', **kwargs):
         self.x = x
@@ -306,7 +697,7 @@ class TextFragment(object):
         self.font_size = str(kwargs.get('font_size', FONT_SIZE))
         self.link = kwargs.get('link', '')
 
-    def draw(self, root_element):
+    def draw(self, root_element, stream=None):
         if self.link:
             root_element = ET.SubElement(root_element, 'a')
             # TODO add validation to check that self.link is in fact an URL
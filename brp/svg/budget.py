@@ -0,0 +1,109 @@
+'''
+Automatic choice between vector (draw) and raster (rdraw) output of layers.
+
+Before drawing, the size of the SVG output of each plot layer is estimated
+(see BasePlotter.estimate_size). If the layers of a PlotContainer (or of
+all PlotContainers on an SVGCanvas) exceed an element or byte budget, the
+largest layers that were added in automatic mode are switched to their
+rasterized fallback until the budget is met.
+'''
+
+
+class RasterDecision(object):
+    '''
+    Records whether a plot layer is drawn as vector or raster output.
+
+    Attributes:
+
+        * `plotter` -- The BasePlotter subclass instance (the plot layer).
+        * `n_elements` -- Estimated number of SVG elements for the vector
+          output, None if unknown.
+        * `n_bytes` -- Estimated number of bytes for the vector output, None
+          if unknown.
+        * `automatic` -- Boolean, True if the choice is left to the budget.
+        * `raster` -- Boolean, True if the layer is rasterized.
+        * `reason` -- String explaining the choice.
+    '''
+    def __init__(self, plotter, raster=None):
+        '''
+        Arguments:
+
+            * `plotter` -- BasePlotter subclass instance.
+            * `raster` -- True (always rasterize), False (never rasterize)
+              or None (automatic, rasterize only when over budget).
+        '''
+        self.plotter = plotter
+        estimate = plotter.estimate_size()
+        if estimate is None:
+            self.n_elements, self.n_bytes = None, None
+        else:
+            self.n_elements, self.n_bytes = estimate
+        self.automatic = raster is None
+        self.raster = bool(raster)
+        if self.automatic:
+            self.reason = 'within budget'
+        else:
+            self.reason = 'requested'
+
+    def __str__(self):
+        if self.n_elements is None:
+            size = 'size unknown'
+        else:
+            size = '~%d elements, ~%d bytes' % (self.n_elements,
+                                                 self.n_bytes)
+        return '%s: %s (%s; %s)' % (self.plotter.__class__.__name__,
+                                    'raster' if self.raster else 'vector',
+                                    size, self.reason)
+
+
+def estimate_total(decisions):
+    '''
+    Estimate the number of SVG elements and bytes for a list of layers.
+
+    Rasterized layers count as one element, their size in bytes (that of
+    the embedded PNG) cannot be known before drawing and is not counted.
+    Layers without an estimate are not counted either.
+    '''
+    n_elements = 0
+    n_bytes = 0
+    for d in decisions:
+        if d.raster:
+            n_elements += 1
+        elif d.n_elements is not None:
+            n_elements += d.n_elements
+            n_bytes += d.n_bytes
+    return n_elements, n_bytes
+
+
+def apply_budget(decisions, element_budget=None, byte_budget=None,
+                 scope='panel'):
+    '''
+    Rasterize automatic layers (largest first) until within budget.
+
+    Arguments:
+
+        * `decisions` -- List of RasterDecision instances, updated in place.
+        * `element_budget` -- Maximum number of SVG elements, None for no
+          maximum.
+        * `byte_budget` -- Maximum number of bytes of SVG output, None for
+          no maximum.
+        * `scope` -- String naming the budget in the reported reasons.
+    '''
+    def over_budget():
+        n_elements, n_bytes = estimate_total(decisions)
+        return ((element_budget is not None and n_elements > element_budget)
+                or (byte_budget is not None and n_bytes > byte_budget))
+
+    candidates = [d for d in decisions if d.automatic and not d.raster and
+                  d.n_elements is not None]
+    candidates.sort(key=lambda d: (d.n_bytes, d.n_elements), reverse=True)
+    for d in candidates:
+        if not over_budget():
+            break
+        d.raster = True
+        d.reason = '%s budget exceeded' % scope
+
+
+def format_raster_report(decisions):
+    '''Format a list of RasterDecision instances, one line per layer.'''
+    return '\n'.join(str(d) for d in decisions)
@@ -153,10 +153,10 @@ SVG_COLOR_KEYWORDS = {
 
 
 def svg_color2rgba_color(svg_color):
-    if svg_color[0] == ['#']:
-        r = int(svg_color[0:2], 16)
-        g = int(svg_color[2:4], 16)
-        b = int(svg_color[4:6], 16)
+    if svg_color[0] == '#':
+        r = int(svg_color[1:3], 16)
+        g = int(svg_color[3:5], 16)
+        b = int(svg_color[5:7], 16)
         a = 255
         return (r, g, b, a)
     else:
@@ -0,0 +1,215 @@
+'''
+Compact encoding of line geometry as SVG <path> elements.
+
+Coordinates are first rounded to a grid of 10 ** -precision SVG units,
+after that the path is encoded with relative moves between grid points (so
+rounding errors do not accumulate), with horizontal and vertical moves
+where possible, without trailing zeros and without separators that the SVG
+path syntax does not need.
+
+In integer mode the coordinates are written as whole numbers of grid units
+and the path is scaled back with a transform (this also scales stroke
+widths and dash patterns, which are compensated for).
+'''
+from __future__ import division
+
+import numpy
+
+from brp.svg.et_import import ET
+
+
+class PathEncoder(object):
+    '''
+    Encodes polylines as the 'd' attribute of SVG <path> elements.
+
+    >>> from brp.svg.encoder import PathEncoder
+    >>> PathEncoder().path_data([([10, 20, 20.5], [10, 10, 5.25])])
+    'M10 10h10l.5-4.75'
+    '''
+    def __init__(self, precision=2, integer=False):
+        '''
+        Arguments:
+
+            * `precision` -- Number of decimals of the coordinates, default
+              2 (like the rest of the SVG output).
+            * `integer` -- Boolean, if True the coordinates are written as
+              integers (multiplied by 10 ** precision) and the paths are
+              scaled back with a transform. Default False.
+        '''
+        assert precision >= 0
+        self.precision = precision
+        self.integer = integer
+        self.scale = 10 ** precision
+
+    def format(self, value):
+        '''Format an integer number of grid units.'''
+        if self.integer or not self.precision:
+            return str(value)
+        digits = '%0*d' % (self.precision + 1, abs(value))
+        whole = digits[:-self.precision].lstrip('0')
+        fraction = digits[-self.precision:].rstrip('0')
+        if fraction:
+            number = whole + '.' + fraction
+        elif whole:
+            number = whole
+        else:
+            return '0'
+        if value < 0:
+            return '-' + number
+        return number
+
+    def _subpaths(self, pieces):
+        '''Round the pieces to the grid, split them at non finite values.'''
+        for xs, ys in pieces:
+            xs = numpy.asarray(xs, dtype=numpy.float64)
+            ys = numpy.asarray(ys, dtype=numpy.float64)
+            finite = numpy.isfinite(xs) & numpy.isfinite(ys)
+            if finite.all():
+                runs = [slice(None)]
+            else:
+                # Find the runs of consecutive finite vertices.
+                edges = numpy.diff(numpy.concatenate(([0], finite, [0])))
+                starts = numpy.flatnonzero(edges == 1)
+                stops = numpy.flatnonzero(edges == -1)
+                runs = [slice(a, b) for a, b in zip(starts, stops)]
+            for run in runs:
+                gx = numpy.round(xs[run] * self.scale).astype(numpy.int64)
+                gy = numpy.round(ys[run] * self.scale).astype(numpy.int64)
+                if len(gx) > 1:
+                    yield _simplify(gx, gy)
+
+    def path_data(self, pieces):
+        '''
+        Encode polylines as path data.
+
+        Arguments:
+
+            * `pieces` -- Sequence of (xs, ys) tuples, each a polyline with
+              sequences (or NumPy arrays) of x and y coordinates. Non finite
+              coordinates break a polyline in two.
+
+        Returns:
+            String, the 'd' attribute for an SVG path.
+        '''
+        # Relative moves repeat a lot, format each number only once.
+        formatted = {}
+
+        def fmt(value):
+            try:
+                return formatted[value]
+            except KeyError:
+                formatted[value] = self.format(value)
+                return formatted[value]
+
+        tokens = []
+        current = None
+        for gx, gy in self._subpaths(pieces):
+            start_x, start_y = int(gx[0]), int(gy[0])
+            absolute = ['M', fmt(start_x), fmt(start_y)]
+            if current is None:
+                tokens.extend(absolute)
+            else:
+                relative = ['m', fmt(start_x - current[0]),
+                            fmt(start_y - current[1])]
+                if len(''.join(relative)) < len(''.join(absolute)):
+                    tokens.extend(relative)
+                else:
+                    tokens.extend(absolute)
+
+            dx = numpy.diff(gx).tolist()
+            dy = numpy.diff(gy).tolist()
+            command = None
+            for step_x, step_y in zip(dx, dy):
+                if step_y == 0:
+                    if step_x == 0:
+                        continue
+                    if command != 'h':
+                        command = 'h'
+                        tokens.append('h')
+                    tokens.append(fmt(step_x))
+                elif step_x == 0:
+                    if command != 'v':
+                        command = 'v'
+                        tokens.append('v')
+                    tokens.append(fmt(step_y))
+                else:
+                    if command != 'l':
+                        command = 'l'
+                        tokens.append('l')
+                    tokens.append(fmt(step_x))
+                    tokens.append(fmt(step_y))
+            current = int(gx[-1]), int(gy[-1])
+        return _join(tokens)
+
+    def add_path(self, root_element, pieces, stroke_width=None,
+                 dasharray=None, **attributes):
+        '''
+        Add a <path> element for some polylines.
+
+        Arguments:
+
+            * `root_element` -- ElementTree Element that receives the path.
+            * `pieces` -- Sequence of (xs, ys) polylines, see path_data.
+            * `stroke_width` -- Optional stroke width (SVG units).
+            * `dasharray` -- Optional dash pattern, string of comma or space
+              separated numbers (SVG units).
+
+        Other keyword arguments are set as attributes of the path.
+        '''
+        p = ET.SubElement(root_element, 'path')
+        for key, value in attributes.items():
+            p.set(key.replace('_', '-'), value)
+        p.set('d', self.path_data(pieces))
+        if self.integer:
+            # Undo the scaling of the coordinates (and of the stroke).
+            p.set('transform', 'scale(%r)' % (1 / self.scale))
+            if stroke_width is None:
+                stroke_width = 1
+            stroke_width = stroke_width * self.scale
+            if dasharray:
+                dasharray = ','.join('%g' % (float(d) * self.scale) for d in
+                                     dasharray.replace(',', ' ').split())
+        if stroke_width is not None:
+            p.set('stroke-width', '%g' % stroke_width)
+        if dasharray:
+            p.set('style', 'stroke-dasharray:%s' % dasharray)
+        return p
+
+
+def _simplify(gx, gy):
+    '''
+    Drop repeated vertices and vertices in the middle of a horizontal or
+    vertical stretch (the steps before and after go the same way).
+    '''
+    dx = numpy.diff(gx)
+    dy = numpy.diff(gy)
+    moves = numpy.concatenate(([True], (dx != 0) | (dy != 0)))
+    gx, gy = gx[moves], gy[moves]
+    if len(gx) < 3:
+        return gx, gy
+    sx = numpy.sign(numpy.diff(gx))
+    sy = numpy.sign(numpy.diff(gy))
+    straight = (((sy[:-1] == 0) & (sy[1:] == 0) & (sx[:-1] == sx[1:])) |
+                ((sx[:-1] == 0) & (sx[1:] == 0) & (sy[:-1] == sy[1:])))
+    keep = numpy.concatenate(([True], ~straight, [True]))
+    return gx[keep], gy[keep]
+
+
+def _join(tokens):
+    '''Join path data tokens, leaving out separators where possible.'''
+    out = []
+    previous = 'M'
+    for token in tokens:
+        # A separator is only needed between two numbers, and then not if
+        # the second one starts with a sign or (after a number with a
+        # decimal point) with a decimal point.
+        if not previous.isalpha():
+            first = token[0]
+            if first.isdigit() or (first == '.' and '.' not in previous):
+                out.append(' ')
+        out.append(token)
+        previous = token
+    return ''.join(out)
+
+
+DEFAULT_ENCODER = PathEncoder()
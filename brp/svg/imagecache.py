@@ -0,0 +1,143 @@
+'''
+Cache of encoded (PNG, base64 data URL) images.
+
+Color coding an array and encoding it as PNG and base64 is the expensive
+part of drawing an Array2dPlotter. When the same array is drawn again with
+the same gradient (redrawing a canvas, drawing it at another size) the
+encoded image is taken from a bounded least recently used cache instead.
+'''
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy
+
+
+class ImageCache(object):
+    '''
+    Least recently used cache of encoded images.
+
+    Attributes:
+
+        * `hits` -- Number of lookups that found an encoded image.
+        * `misses` -- Number of lookups that did not.
+        * `evictions` -- Number of encoded images dropped to stay within the
+          size limits.
+
+    >>> from brp.svg.imagecache import ImageCache
+    >>> cache = ImageCache(max_entries=1)
+    >>> cache.get('a', lambda: 'A'), cache.get('a', lambda: 'B')
+    ('A', 'A')
+    >>> cache.get('b', lambda: 'B'), cache.get('a', lambda: 'C')
+    ('B', 'C')
+    >>> cache.hits, cache.misses, cache.evictions
+    (1, 3, 2)
+    '''
+    def __init__(self, max_entries=64, max_bytes=64 * 2 ** 20):
+        '''
+        Arguments:
+
+            * `max_entries` -- Maximum number of encoded images, default 64.
+            * `max_bytes` -- Maximum total length of the encoded images,
+              default 64 MiB.
+        '''
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._n_bytes = 0
+        # Plot layers can be drawn by several threads (see PlotContainer).
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getstate__(self):
+        # Locks cannot be pickled (plotters are pickled for SVGCanvas.draw
+        # with several processes).
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, encode):
+        '''
+        Look up an encoded image, encode it if it is not in the cache.
+
+        Arguments:
+
+            * `key` -- Hashable key of the image, see image_key.
+            * `encode` -- Function without arguments that returns the
+              encoded image (a string), called on a cache miss.
+
+        Returns:
+            The encoded image.
+        '''
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                value = self._entries.pop(key)
+                self._entries[key] = value
+                return value
+            self.misses += 1
+        # Encode without holding the lock, so that other threads can go on.
+        value = encode()
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = value
+                self._n_bytes += len(value)
+                self._evict()
+        return value
+
+    def _evict(self):
+        '''Drop least recently used images until within the limits.'''
+        while self._entries and (len(self._entries) > self.max_entries or
+                                 self._n_bytes > self.max_bytes):
+            key, value = self._entries.popitem(last=False)
+            self._n_bytes -= len(value)
+            self.evictions += 1
+
+    def clear(self):
+        '''Drop all encoded images (the counters are kept).'''
+        with self._lock:
+            self._entries.clear()
+            self._n_bytes = 0
+
+
+def array_digest(ar):
+    '''Content hash of a NumPy array (including its shape and type).'''
+    ar = numpy.ascontiguousarray(ar)
+    digest = hashlib.sha1(ar.view(numpy.uint8))
+    digest.update(repr((ar.shape, ar.dtype.str)).encode('ascii'))
+    return digest.hexdigest()
+
+
+def gradient_key(gradient):
+    '''
+    String describing the parameters of a gradient (its public attributes).
+    '''
+    parameters = sorted((k, v) for k, v in vars(gradient).items()
+                        if not k.startswith('_'))
+    return '%s%r' % (gradient.__class__.__name__, parameters)
+
+
+def image_key(ar, gradient, resolution):
+    '''
+    Cache key for an array color coded with a gradient.
+
+    Arguments:
+
+        * `ar` -- NumPy array of values.
+        * `gradient` -- Gradient instance used for the color coding.
+        * `resolution` -- Tuple (width, height) of the image in pixels.
+    '''
+    return array_digest(ar), gradient_key(gradient), tuple(resolution)
+
+
+# Cache shared by all Array2dPlotter instances (unless told otherwise).
+IMAGE_CACHE = ImageCache()
@@ -96,7 +96,8 @@ class LeftAxisPlotter(BasePlotter, AxisPlotterMixin):
             log = self.kwargs.get('log', False)
 
         draw_left_axis(root_element, self.x_offset, self.y_offset, self.height,
-                       y_transform, interval, log, **self.kwargs)
+                       y_transform, interval, log, encoder=self.encoder,
+                       **self.kwargs)
 
 
 class RightAxisPlotter(BasePlotter, AxisPlotterMixin):
@@ -127,7 +128,8 @@ class RightAxisPlotter(BasePlotter, AxisPlotterMixin):
             log = self.kwargs.get('log', False)
 
         draw_right_axis(root_element, self.x_offset, self.y_offset,
-                        self.height, y_transform, interval, log, **self.kwargs)
+                        self.height, y_transform, interval, log,
+                        encoder=self.encoder, **self.kwargs)
 
 
 class TopAxisPlotter(BasePlotter, AxisPlotterMixin):
@@ -158,7 +160,8 @@ class TopAxisPlotter(BasePlotter, AxisPlotterMixin):
             log = self.kwargs.get('log', False)
 
         draw_top_axis(root_element, self.x_offset, self.y_offset, self.width,
-                      x_transform, interval, log, **self.kwargs)
+                      x_transform, interval, log, encoder=self.encoder,
+                      **self.kwargs)
 
 
 class BottomAxisPlotter(BasePlotter, AxisPlotterMixin):
@@ -189,4 +192,5 @@ class BottomAxisPlotter(BasePlotter, AxisPlotterMixin):
             log = self.kwargs.get('log', False)
 
         draw_bottom_axis(root_element, self.x_offset, self.y_offset,
-                         self.width, x_transform, interval, log, **self.kwargs)
+                         self.width, x_transform, interval, log,
+                         encoder=self.encoder, **self.kwargs)
@@ -4,6 +4,7 @@ from xml.sax.saxutils import escape
 from brp.core.tickmarks import find_tickmarks_log, find_tickmarks
 
 from brp.svg.et_import import ET
+from brp.svg.encoder import DEFAULT_ENCODER
 
 from brp.svg.constants import AXIS_SIZE, TICKMARK_LABEL_SPACING, FONT_SIZE
 from brp.svg.constants import UNITS_PER_TICKMARK
@@ -50,6 +51,9 @@ def draw_left_axis(root_element, x_offset, y_offset, height, y_transform,
 
         `hide_tickmarklabels` --- Boolean, True if tickmarks and labels for
             this axis should be hidden.
+
+        `encoder` --- brp.svg.encoder.PathEncoder used for the axis line and
+            the tickmarks.
     '''
 
     color = options.get('color', 'black')
@@ -60,11 +64,10 @@ def draw_left_axis(root_element, x_offset, y_offset, height, y_transform,
     axes_text = ET.SubElement(root_element, 'g')
     axes_text.set('fill', color)
 
-    line = ET.SubElement(axes_lines, 'line')
-    line.set('x1', '%.2f' % (x_offset + AXIS_SIZE))
-    line.set('y1', '%.2f' % (y_offset + AXIS_SIZE))
-    line.set('x2', '%.2f' % (x_offset + AXIS_SIZE))
-    line.set('y2', '%.2f' % (y_offset + height - AXIS_SIZE))
+    # The axis line and the tickmarks are drawn as one path.
+    encoder = options.get('encoder', DEFAULT_ENCODER)
+    pieces = [([x_offset + AXIS_SIZE, x_offset + AXIS_SIZE],
+               [y_offset + AXIS_SIZE, y_offset + height - AXIS_SIZE])]
 
     hide_tickmarks = options.get('hide_tickmarks', False)
 
@@ -74,12 +77,8 @@ def draw_left_axis(root_element, x_offset, y_offset, height, y_transform,
 
         for y, size in tickmarks:
             ny = y_transform(y)
-            tm = ET.SubElement(axes_lines, 'line')
-            tm.set('x1', '%.2f' % (x_offset + AXIS_SIZE))
-            tm.set('x2', '%.2f' % (x_offset + AXIS_SIZE + size * 0.7))
-            tm.set('y1', '%.2f' % (ny))
-            tm.set('y2', '%.2f' % (ny))
-            tm.set('stroke', color)
+            x_axis = x_offset + AXIS_SIZE
+            pieces.append(([x_axis, x_axis + size * 0.7], [ny, ny]))
 
             if hide_tickmarklabels:
                 continue
@@ -97,6 +96,8 @@ def draw_left_axis(root_element, x_offset, y_offset, height, y_transform,
                           ny))
             ticklabel.text = escape(str(y))
 
+    encoder.add_path(axes_lines, pieces, fill='none')
+
     hide_label = options.get('hide_label', False)
     label_link = options.get('label_link', None)
     if not hide_label:
@@ -132,11 +133,10 @@ def draw_top_axis(root_element, x_offset, y_offset, width, x_transform,
     axes_text = ET.SubElement(root_element, 'g')
     axes_text.set('fill', color)
 
-    line = ET.SubElement(axes_lines, 'line')
-    line.set('x1', '%.2f' % (x_offset + AXIS_SIZE))
-    line.set('y1', '%.2f' % (y_offset + AXIS_SIZE))
-    line.set('x2', '%.2f' % (x_offset + width - AXIS_SIZE))
-    line.set('y2', '%.2f' % (y_offset + AXIS_SIZE))
+    # The axis line and the tickmarks are drawn as one path.
+    encoder = options.get('encoder', DEFAULT_ENCODER)
+    pieces = [([x_offset + AXIS_SIZE, x_offset + width - AXIS_SIZE],
+               [y_offset + AXIS_SIZE, y_offset + AXIS_SIZE])]
 
     hide_tickmarks = options.get('hide_tickmarks', False)
 
@@ -146,11 +146,8 @@ def draw_top_axis(root_element, x_offset, y_offset, width, x_transform,
 
         for x, size in tickmarks:
             nx = x_transform(x)
-            tm = ET.SubElement(axes_lines, 'line')
-            tm.set('x1', '%.2f' % (nx))
-            tm.set('x2', '%.2f' % (nx))
-            tm.set('y1', '%.2f' % (y_offset + AXIS_SIZE))
-            tm.set('y2', '%.2f' % (y_offset + AXIS_SIZE + size * 0.7))
+            y_axis = y_offset + AXIS_SIZE
+            pieces.append(([nx, nx], [y_axis, y_axis + size * 0.7]))
 
             if hide_tickmarklabels:
                 continue
@@ -165,6 +162,8 @@ def draw_top_axis(root_element, x_offset, y_offset, width, x_transform,
             ticklabel.set('x', '%.2f' % nx)
             ticklabel.text = escape(str(x))
 
+    encoder.add_path(axes_lines, pieces, fill='none')
+
     hide_label = options.get('hide_label', False)
     label_link = options.get('label_link', None)
     if not hide_label:
@@ -197,11 +196,10 @@ def draw_bottom_axis(root_element, x_offset, y_offset, width, x_transform,
     axes_text = ET.SubElement(root_element, 'g')
     axes_text.set('fill', color)
 
-    line = ET.SubElement(axes_lines, 'line')
-    line.set('x1', '%.2f' % (x_offset + AXIS_SIZE))
-    line.set('y1', '%.2f' % (y_offset + AXIS_SIZE))
-    line.set('x2', '%.2f' % (x_offset + width - AXIS_SIZE))
-    line.set('y2', '%.2f' % (y_offset + AXIS_SIZE))
+    # The axis line and the tickmarks are drawn as one path.
+    encoder = options.get('encoder', DEFAULT_ENCODER)
+    pieces = [([x_offset + AXIS_SIZE, x_offset + width - AXIS_SIZE],
+               [y_offset + AXIS_SIZE, y_offset + AXIS_SIZE])]
 
     hide_tickmarks = options.get('hide_tickmarks', False)
 
@@ -211,11 +209,8 @@ def draw_bottom_axis(root_element, x_offset, y_offset, width, x_transform,
 
         for x, size in tickmarks:
             nx = x_transform(x)
-            tm = ET.SubElement(axes_lines, 'line')
-            tm.set('x1', '%.2f' % (nx))
-            tm.set('x2', '%.2f' % (nx))
-            tm.set('y1', '%.2f' % (y_offset + AXIS_SIZE))
-            tm.set('y2', '%.2f' % (y_offset + AXIS_SIZE - size * 0.7))
+            y_axis = y_offset + AXIS_SIZE
+            pieces.append(([nx, nx], [y_axis, y_axis - size * 0.7]))
 
             if hide_tickmarklabels:
                 continue
@@ -230,6 +225,8 @@ def draw_bottom_axis(root_element, x_offset, y_offset, width, x_transform,
             ticklabel.set('x', '%.2f' % nx)
             ticklabel.text = escape(str(x))
 
+    encoder.add_path(axes_lines, pieces, fill='none')
+
     hide_label = options.get('hide_label', False)
     label_link = options.get('label_link', None)
     if not hide_label:
@@ -262,11 +259,10 @@ def draw_right_axis(root_element, x_offset, y_offset, height, y_transform,
     axes_text = ET.SubElement(root_element, 'g')
     axes_text.set('fill', color)
 
-    line = ET.SubElement(axes_lines, 'line')
-    line.set('x1', '%.2f' % (x_offset + AXIS_SIZE))
-    line.set('y1', '%.2f' % (y_offset + AXIS_SIZE))
-    line.set('x2', '%.2f' % (x_offset + AXIS_SIZE))
-    line.set('y2', '%.2f' % (y_offset + height - AXIS_SIZE))
+    # The axis line and the tickmarks are drawn as one path.
+    encoder = options.get('encoder', DEFAULT_ENCODER)
+    pieces = [([x_offset + AXIS_SIZE, x_offset + AXIS_SIZE],
+               [y_offset + AXIS_SIZE, y_offset + height - AXIS_SIZE])]
 
     hide_tickmarks = options.get('hide_tickmarks', False)
 
@@ -276,11 +272,8 @@ def draw_right_axis(root_element, x_offset, y_offset, height, y_transform,
 
         for y, size in tickmarks:
             ny = y_transform(y)
-            tm = ET.SubElement(axes_lines, 'line')
-            tm.set('x1', '%.2f' % (x_offset + AXIS_SIZE))
-            tm.set('x2', '%.2f' % (x_offset + AXIS_SIZE - size * 0.7))
-            tm.set('y1', '%.2f' % (ny))
-            tm.set('y2', '%.2f' % (ny))
+            x_axis = x_offset + AXIS_SIZE
+            pieces.append(([x_axis, x_axis - size * 0.7], [ny, ny]))
 
             if hide_tickmarklabels:
                 continue
@@ -298,6 +291,8 @@ def draw_right_axis(root_element, x_offset, y_offset, height, y_transform,
                           0.5 * FONT_SIZE, ny))
             ticklabel.text = escape(str(y))
 
+    encoder.add_path(axes_lines, pieces, fill='none')
+
     hide_label = options.get('hide_label', False)
     label_link = options.get('label_link', None)
     if not hide_label:
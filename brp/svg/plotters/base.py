@@ -2,13 +2,40 @@
 Module containing the base class for all plotters (defining their API).
 '''
 from brp.core.exceptions import NotImplementedError
+from brp.svg.encoder import DEFAULT_ENCODER
 
 
 class BasePlotter(object):
     '''Base class for ..Plotter class definitions, defines interface.'''
+    x_log = False
+    y_log = False
+    encoder = DEFAULT_ENCODER
+    # True if draw itself renders and encodes an image, PlotContainer can
+    # then run it in a thread like the rasterized fallbacks.
+    raster_output = False
+    # Bounding box of the data (cached by some plotters, see data_changed).
+    _bbox_cache = None
+
     def __init__(self):
         pass
 
+    def prepare_axes(self, x_log, y_log):
+        '''Callback, is called with the axis types before prepare_bbox.'''
+        self.x_log = x_log
+        self.y_log = y_log
+
+    def set_encoder(self, encoder):
+        '''Callback, is called with the PathEncoder for line geometry.'''
+        self.encoder = encoder
+
+    def data_changed(self):
+        '''
+        Call after changing the data of this plotter in place (like arrays
+        passed with copy=False), drops what was cached about the data like
+        its bounding box. Plotters with a set_data method call it for you.
+        '''
+        self._bbox_cache = None
+
     def prepare_bbox(self, data_bbox):
         '''Update data boundingbox in a way that is appropriate.'''
         return data_bbox
@@ -17,6 +44,16 @@ class BasePlotter(object):
         '''Callback, is called when data and SVG bounding boxes are known.'''
         pass
 
+    def estimate_size(self):
+        '''
+        Estimate the size of the SVG output of draw.
+
+        Returns:
+            A tuple (n_elements, n_bytes) or None if no estimate is
+            available (such layers are never rasterized automatically).
+        '''
+        return None
+
     def draw(self, root_element, x_transform, y_transform):
         '''Draw the graphical element that is represented by this plotter.'''
         pass
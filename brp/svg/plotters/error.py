@@ -1,77 +1,162 @@
 from __future__ import division
 
 from itertools import izip
-import StringIO
-from base64 import encodestring
 
+import numpy
 from PIL import Image, ImageDraw
 
+from brp.core.bbox import find_bounding_box, CHUNK_SIZE
+from brp.core.columns import as_column
 from brp.svg.et_import import ET
 from brp.svg.plotters.scatter import ScatterPlotter, FakeList
+from brp.svg.plotters.raster import add_image
 from brp.svg.plotters.symbol import HorizontalErrorBarSymbol
 from brp.svg.plotters.symbol import VerticalErrorBarSymbol
-from brp.svg.colornames import svg_color2rgba_color
+from brp.svg.plotters.symbol import DrawAdapter, adapt_symbols
 
 
 class ErrorPlotter(ScatterPlotter):
     def __init__(self, *args, **kwargs):
-        '''Plot 2d scatter plot with errors (can do asymmetrical ones).'''
+        '''
+        Plot 2d scatter plot with errors (can do asymmetrical ones).
+
+        The errors `err_x` and `err_y` are sequences of (lower, upper) pairs,
+        they are stored like the data columns (see ScatterPlotter).
+        '''
         super(ErrorPlotter, self).__init__(*args, **kwargs)
-        N = len(self.datapoints[0])
-        self.err_x = kwargs.get('err_x', [(0, 0) for i in xrange(N)])
-        self.err_y = kwargs.get('err_y', [(0, 0) for i in xrange(N)])
+        self.err_x, self.err_y = self._errors(len(self.datapoints[0]),
+                                              kwargs)
         self.symbols.extend([HorizontalErrorBarSymbol(),
                             VerticalErrorBarSymbol()])
 
-    def prepare_bbox(self, bbox):
-        '''Update bounding box taking into account also the errors.'''
-        if not bbox:
-            bbox = [self.datapoints[0][0], self.datapoints[1][0],
-                    self.datapoints[0][0], self.datapoints[1][0]]
-            # bounding boxes are like : [xmin, ymin, xmax, ymax]
-        else:
-            bbox = list(bbox)
-        for x, y, ex, ey in zip(self.datapoints[0], self.datapoints[1],
-                                self.err_x, self.err_y):
-            if x - ex[0] < bbox[0]:
-                bbox[0] = x - ex[0]
-            elif x + ex[1] > bbox[2]:
-                bbox[2] = x + ex[1]
-            if y - ey[0] < bbox[1]:
-                bbox[1] = y - ey[0]
-            elif y + ey[1] > bbox[3]:
-                bbox[3] = y + ey[1]
-        return tuple(bbox)
+    def _errors(self, N, kwargs):
+        '''The err_x and err_y columns for N data points (default 0).'''
+        errors = []
+        for key in ('err_x', 'err_y'):
+            if key in kwargs:
+                err = as_column(kwargs[key], self._dtype, self._copy)
+            else:
+                err = numpy.zeros((N, 2), dtype=self._dtype)
+            assert err.shape == (N, 2)
+            errors.append(err)
+        return errors
+
+    def set_data(self, *args, **kwargs):
+        '''
+        Replace the data columns and the errors (the `err_x` and `err_y`
+        keyword arguments, 0 if not provided), see ScatterPlotter.set_data.
+        '''
+        super(ErrorPlotter, self).set_data(*args)
+        self.err_x, self.err_y = self._errors(len(self.datapoints[0]),
+                                              kwargs)
+
+    def _find_bbox(self):
+        '''
+        Bounding box of the data taking into account also the errors.
+
+        The x and y extents are found separately, an error bar that reaches
+        non-positive values on a logarithmic axis only drops that end of the
+        error bar (not the other coordinate or the data point itself).
+        '''
+        x, y = self.datapoints[0], self.datapoints[1]
+        # Extents as degenerate bounding boxes: (min, min, max, max).
+        x_extent = None
+        y_extent = None
+        for start in range(0, len(x), CHUNK_SIZE):
+            s = slice(start, start + CHUNK_SIZE)
+            for values in (x[s], x[s] - self.err_x[s, 0],
+                           x[s] + self.err_x[s, 1]):
+                x_extent = find_bounding_box(values, values, x_extent,
+                                             self.x_log, self.x_log)
+            for values in (y[s], y[s] - self.err_y[s, 0],
+                           y[s] + self.err_y[s, 1]):
+                y_extent = find_bounding_box(values, values, y_extent,
+                                             self.y_log, self.y_log)
+        if x_extent is None or y_extent is None:
+            return None
+        # bounding boxes are like : [xmin, ymin, xmax, ymax]
+        return (x_extent[0], y_extent[0], x_extent[2], y_extent[2])
+
+    def _candidates(self):
+        '''All data points (error bars can reach far, see _inside).'''
+        return slice(0, len(self.datapoints[0]))
+
+    def _inside(self, s):
+        '''
+        Which of the data points in slice `s` have error bars that reach the
+        visible data bounding box.
+        '''
+        x_min, y_min, x_max, y_max = self.view_bbox
+        x, y = self.datapoints[0][s], self.datapoints[1][s]
+        err_x, err_y = self.err_x[s], self.err_y[s]
+        with numpy.errstate(invalid='ignore'):
+            return ((x + err_x[:, 1] >= x_min) &
+                    (x - err_x[:, 0] <= x_max) &
+                    (y + err_y[:, 1] >= y_min) &
+                    (y - err_y[:, 0] <= y_max))
 
     def draw(self, root_element, x_transform, y_transform):
 
+        # Transform the visible datapoints and the ends of the error bars in
+        # one go.
+        selection = self._visible()
+        x, y = self.datapoints[0][selection], self.datapoints[1][selection]
+        err_x, err_y = self.err_x[selection], self.err_y[selection]
+        tx = x_transform(x)
+        ty = y_transform(y)
+        tminx = x_transform(x - err_x[:, 0])
+        tmaxx = x_transform(x + err_x[:, 1])
+        tminy = y_transform(y - err_y[:, 0])
+        tmaxy = y_transform(y + err_y[:, 1])
+        # Leave out the datapoints that are hidden by others, the error bars
+        # are part of what a datapoint looks like.
+        idx = self._cull(tx, ty, selection, [tminx, tmaxx, tminy, tmaxy])
+        selection = self._compose(selection, idx)
+        datapoints = [column[selection] for column in self.datapoints]
+        tx, ty = tx[idx].tolist(), ty[idx].tolist()
+        tminx, tmaxx = tminx[idx].tolist(), tmaxx[idx].tolist()
+        tminy, tmaxy = tminy[idx].tolist(), tmaxy[idx].tolist()
+
         if self.links:
-            L = self.links
+            L = self.links.take(selection)
         else:
             L = FakeList('')
+        symbols = adapt_symbols(self._svg_symbols(root_element),
+                                x_transform, y_transform)
+        # Symbols that override draw get the errors of their data point.
+        if any(isinstance(s, DrawAdapter) for s in symbols):
+            EX, EY = err_x[idx].tolist(), err_y[idx].tolist()
+        else:
+            EX = EY = FakeList(None)
 
         if self.gradient and self.gradient_i is not None:
-            for i, datapoint in enumerate(izip(*self.datapoints)):
-                color = self.gradient.get_css_color(datapoint[self.gradient_i])
-                for s in self.symbols:
-                    s.draw(root_element, x_transform, y_transform, *datapoint,
-                           color=color, link=L[i], err_x=self.err_x,
-                           err_y=self.err_y)
+            colors = self.gradient.get_css_colors(
+                datapoints[self.gradient_i])
+            for i, datapoint in enumerate(izip(*datapoints)):
+                for s in symbols:
+                    s.draw_xy(root_element, tx[i], ty[i], *datapoint,
+                              color=colors[i], link=L[i], minx=tminx[i],
+                              maxx=tmaxx[i], miny=tminy[i], maxy=tmaxy[i],
+                              err_x=EX[i], err_y=EY[i])
         elif self.colors:
-            for i, datapoint in enumerate(izip(*self.datapoints)):
-                color = self.colors[i]
-                for s in self.symbols:
-                    s.draw(root_element, x_transform, y_transform, *datapoint,
-                           color=color, link=L[i], err_x=self.err_x[i],
-                           err_y=self.err_y[i])
+            colors = self.colors.take(selection)
+            for i, datapoint in enumerate(izip(*datapoints)):
+                color = colors[i]
+                for s in symbols:
+                    s.draw_xy(root_element, tx[i], ty[i], *datapoint,
+                              color=color, link=L[i], minx=tminx[i],
+                              maxx=tmaxx[i], miny=tminy[i], maxy=tmaxy[i],
+                              err_x=EX[i], err_y=EY[i])
         else:
             root_element = ET.SubElement(root_element, 'g')
             root_element.set('stroke', self.color)
             root_element.set('fill', self.color)
-            for i, datapoint in enumerate(izip(*self.datapoints)):
-                for s in self.symbols:
-                    s.draw(root_element, x_transform, y_transform, *datapoint,
-                           link=L[i], err_x=self.err_x[i], err_y=self.err_y[i])
+            for i, datapoint in enumerate(izip(*datapoints)):
+                for s in symbols:
+                    s.draw_xy(root_element, tx[i], ty[i], *datapoint,
+                              link=L[i], minx=tminx[i], maxx=tmaxx[i],
+                              miny=tminy[i], maxy=tmaxy[i], err_x=EX[i],
+                              err_y=EY[i])
 
     def rdraw(self, root_element, x_transform, y_transform, svg_bbox):
         width = svg_bbox[2] - svg_bbox[0]
@@ -83,38 +168,19 @@ class ErrorPlotter(ScatterPlotter):
         imdraw = ImageDraw.Draw(im)
 
         # above should be hidden (not re-implemented in each subclass)
-        if self.gradient and self.gradient_i is not None:
-            for i, datapoint in enumerate(izip(*self.datapoints)):
-                rgba_color = self.gradient.get_rgba_color(
-                    datapoint[self.gradient_i])
-                for s in self.symbols:
-                    s.draw(imdraw, x_transform, y_transform, *datapoint,
-                           err_x=self.err_x, err_y=self.err_y,
-                           rgba_color=rgba_color)
-        elif self.colors:
-            for i, datapoint in enumerate(izip(*self.datapoints)):
-                rgba_color = svg_color2rgba_color(self.colors[i])
-                for s in self.symbols:
-                    s.rdraw(imdraw, x_transform, y_transform, *datapoint,
-                            err_x=self.err_x[i], err_y=self.err_y[i],
-                            rgba_color=rgba_color)
-        else:
-            rgba_color = svg_color2rgba_color(self.color)
-            for i, datapoint in enumerate(izip(*self.datapoints)):
+        for selection in self._visible_chunks():
+            datapoints = [column[selection] for column in self.datapoints]
+            err_x, err_y = self.err_x[selection], self.err_y[selection]
+            rgba_colors = self._rgba_colors(selection)
+            if rgba_colors.ndim == 1:
+                rgba_colors = FakeList(tuple(rgba_colors.tolist()))
+            else:
+                rgba_colors = [tuple(c) for c in rgba_colors.tolist()]
+            for i, datapoint in enumerate(izip(*datapoints)):
                 for s in self.symbols:
                     s.rdraw(imdraw, x_transform, y_transform, *datapoint,
-                            err_x=self.err_x[i], err_y=self.err_y[i],
-                            rgba_color=rgba_color)
+                            err_x=err_x[i], err_y=err_y[i],
+                            rgba_color=rgba_colors[i])
         # below should be hidden (not re-implemented in each subclass)
 
-        tmp = StringIO.StringIO()
-        im.save(tmp, format='png')
-        encoded_png = 'data:image/png;base64,\n' + encodestring(tmp.getvalue())
-
-        img = ET.SubElement(root_element, 'image')
-        img.set('xlink:href', encoded_png)
-        img.set('x', '%.2f' % min(svg_bbox[0], svg_bbox[2]))
-        img.set('y', '%.2f' % min(svg_bbox[1], svg_bbox[3]))
-        img.set('width', '%.2f' % width)
-        img.set('height', '%.2f' % height)
-        img.set('preserveAspectRatio', 'none')
+        add_image(root_element, im, svg_bbox)
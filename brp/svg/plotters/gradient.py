@@ -3,9 +3,14 @@ import colorsys
 import copy
 from math import log10
 
+import numpy
+
 from brp.svg.plotters.base import BasePlotter
 from brp.svg.et_import import ET
 
+# Default number of entries in the lookup tables used to color code arrays.
+LUT_SIZE = 4096
+
 
 def fix_gradient_interval(interval):
     '''
@@ -22,6 +27,37 @@ def fix_gradient_interval(interval):
     return interval
 
 
+def _hls_value(m1, m2, hue):
+    '''Vectorized version of colorsys._v .'''
+    hue = numpy.mod(hue, 1.0)
+    out = numpy.where(hue < 2 / 3, m1 + (m2 - m1) * (2 / 3 - hue) * 6, m1)
+    out = numpy.where(hue < 0.5, m2, out)
+    return numpy.where(hue < 1 / 6, m1 + (m2 - m1) * hue * 6, out)
+
+
+def hls_to_rgb(h, l, s):
+    '''
+    Vectorized version of colorsys.hls_to_rgb .
+
+    Arguments:
+
+        * `h`, `l`, `s` -- NumPy arrays with hue, lightness and saturation.
+
+    Returns:
+        NumPy array of shape h.shape + (3,) with the RGB colors.
+    '''
+    m2 = numpy.where(l <= 0.5, l * (1 + s), l + s - (l * s))
+    m1 = 2 * l - m2
+    rgb = numpy.empty(numpy.shape(h) + (3,), dtype=numpy.float64)
+    rgb[..., 0] = _hls_value(m1, m2, h + 1 / 3)
+    rgb[..., 1] = _hls_value(m1, m2, h)
+    rgb[..., 2] = _hls_value(m1, m2, h - 1 / 3)
+    grey = (s == 0)
+    if numpy.any(grey):
+        rgb[grey] = l[grey, numpy.newaxis]
+    return rgb
+
+
 class RGBGradient(object):
     def __init__(self, interval, rgb1, rgb2, *args, **kwargs):
         # Prevent divide-by-zero when setting up color transform.
@@ -33,6 +69,9 @@ class RGBGradient(object):
         self.min_value_color = kwargs.get('min_value_color', (0, 0, 0))
         self.max_value = kwargs.get('max_value', None)
         self.max_value_color = kwargs.get('max_value_color', (1, 1, 1))
+        # The colors are interpolated in HLS space.
+        self.hls1 = colorsys.rgb_to_hls(*self.rgb1)
+        self.hls2 = colorsys.rgb_to_hls(*self.rgb2)
 
     def get_color(self, value):
         if self.min_value is not None and value < self.min_value:
@@ -46,8 +85,8 @@ class RGBGradient(object):
             return self.rgb2
 
         dv = (value - self.interval[0]) / (self.interval[1] - self.interval[0])
-        hls1 = colorsys.rgb_to_hls(*self.rgb1)
-        hls2 = colorsys.rgb_to_hls(*self.rgb2)
+        hls1 = self.hls1
+        hls2 = self.hls2
         dh = hls2[0] - hls1[0]
         dl = hls2[1] - hls1[1]
         ds = hls2[2] - hls1[2]
@@ -64,6 +103,185 @@ class RGBGradient(object):
         red, green, blue = self.get_color(value)
         return int(255 * red), int(255 * green), int(255 * blue), 255
 
+    def _interpolate(self, dv):
+        '''
+        Colors for an array of relative positions dv (0 <= dv <= 1) in the
+        gradient interval. Returns a NumPy array of shape dv.shape + (3,).
+        '''
+        hls1 = self.hls1
+        hls2 = self.hls2
+        return hls_to_rgb(hls1[0] + dv * (hls2[0] - hls1[0]),
+                          hls1[1] + dv * (hls2[1] - hls1[1]),
+                          hls1[2] + dv * (hls2[2] - hls1[2]))
+
+    def _special_colors(self, values):
+        '''
+        List of (mask, rgb) pairs for values outside of the gradient interval
+        and overflow values, later entries take precedence.
+        '''
+        interval = self.interval
+        special = [(values < interval[0], self.rgb1),
+                   (values > interval[1], self.rgb2)]
+        if self.max_value is not None:
+            special.append((values > self.max_value, self.max_value_color))
+        if self.min_value is not None:
+            special.append((values < self.min_value, self.min_value_color))
+        return special
+
+    def get_colors(self, values):
+        '''
+        Vectorized get_color.
+
+        Arguments:
+
+            * `values` -- NumPy array (or sequence) of values.
+
+        Returns:
+            NumPy float array of shape values.shape + (3,) with RGB colors
+            (color channels have values between 0 and 1).
+        '''
+        values = numpy.asarray(values, dtype=numpy.float64)
+        interval = self.interval
+        with numpy.errstate(invalid='ignore'):
+            dv = (values - interval[0]) / (interval[1] - interval[0])
+            colors = self._interpolate(dv)
+            del dv
+            for mask, rgb in self._special_colors(values):
+                if mask.any():
+                    colors[mask] = rgb
+        return colors
+
+    def get_css_colors(self, values, n_colors=None):
+        '''
+        Vectorized get_css_color, returns a list of CSS color strings.
+
+        Arguments:
+
+            * `values` -- NumPy array (or sequence) of values.
+            * `n_colors` -- If provided, the colors are quantized to a lookup
+              table of `n_colors` entries (see get_palette_indices) and only
+              the colors in the lookup table are formatted. Default None.
+        '''
+        if n_colors is None:
+            rgb = (255 * self.get_colors(values)).astype(numpy.int_)
+            return _format_css_colors(rgb)
+        palette, indices = self.get_palette_indices(values, n_colors)
+        css_palette = _format_css_colors(palette.astype(numpy.int_))
+        return [css_palette[i] for i in indices.tolist()]
+
+    def get_rgba_colors(self, values, n_colors=None):
+        '''
+        Vectorized get_rgba_color.
+
+        Arguments:
+
+            * `values` -- NumPy array (or sequence) of values.
+            * `n_colors` -- If provided, the colors are quantized to a lookup
+              table of `n_colors` entries (see get_palette_indices). Default
+              None.
+
+        Returns:
+            NumPy uint8 array of shape values.shape + (4,) with RGBA colors.
+        '''
+        if n_colors is None:
+            rgb = (255 * self.get_colors(values)).astype(numpy.uint8)
+        else:
+            palette, indices = self.get_palette_indices(values, n_colors)
+            rgb = palette[indices]
+        rgba = numpy.empty(rgb.shape[:-1] + (4,), dtype=numpy.uint8)
+        rgba[..., :3] = rgb
+        rgba[..., 3] = 255
+        return rgba
+
+    def get_lut(self, n_colors=LUT_SIZE):
+        '''
+        Compile this gradient into a lookup table of RGB colors.
+
+        Arguments:
+
+            * `n_colors` -- Number of entries in the lookup table, entry i
+              holds the color for the value interval[0] + i * (interval[1] -
+              interval[0]) / (n_colors - 1). Default LUT_SIZE.
+
+        Returns:
+            NumPy uint8 array of shape (n_colors, 3).
+
+        Note:
+            Lookup tables are cached on the gradient instance.
+        '''
+        try:
+            luts = self._luts
+        except AttributeError:
+            luts = self._luts = {}
+        if n_colors not in luts:
+            values = numpy.linspace(self.interval[0], self.interval[1],
+                                    n_colors)
+            luts[n_colors] = (255 * self.get_colors(values)).astype(
+                numpy.uint8)
+        return luts[n_colors]
+
+    def get_palette_indices(self, values, n_colors=LUT_SIZE):
+        '''
+        Quantize the colors for an array of values to a palette.
+
+        Arguments:
+
+            * `values` -- NumPy array (of any shape) of values.
+            * `n_colors` -- Number of entries in the lookup table, see
+              get_lut. Default LUT_SIZE.
+
+        Returns:
+            A tuple (palette, indices), the palette is a NumPy uint8 array
+            of RGB colors (the lookup table followed by the colors for values
+            outside of the interval and the overflow values), indices is a
+            NumPy integer array of shape values.shape with indices into the
+            palette.
+
+        Note:
+            Values inside the interval are mapped to the nearest entry in the
+            lookup table, values outside of the interval and the overflow
+            values get their colors exactly.
+        '''
+        values = numpy.asarray(values)
+        lut = self.get_lut(n_colors)
+        interval = self.interval
+        with numpy.errstate(invalid='ignore'):
+            idx = (values - interval[0]) * \
+                ((n_colors - 1) / (interval[1] - interval[0]))
+            numpy.clip(idx, 0, n_colors - 1, out=idx)
+            idx[numpy.isnan(idx)] = 0
+            idx += 0.5
+            indices = idx.astype(numpy.intp)
+            del idx
+            special = self._special_colors(values)
+            for i, (mask, rgb) in enumerate(special):
+                if mask.any():
+                    indices[mask] = n_colors + i
+        palette = numpy.zeros((n_colors + len(special), 3), dtype=numpy.uint8)
+        palette[:n_colors] = lut
+        for i, (mask, rgb) in enumerate(special):
+            palette[n_colors + i] = (255 * rgb[0], 255 * rgb[1], 255 * rgb[2])
+        return palette, indices
+
+    def colorcode(self, values, n_colors=LUT_SIZE):
+        '''
+        Color code an array of values using a lookup table.
+
+        Arguments:
+
+            * `values` -- NumPy array (of any shape) of values.
+            * `n_colors` -- Number of entries in the lookup table, see
+              get_lut. Default LUT_SIZE.
+
+        Returns:
+            NumPy uint8 array of shape values.shape + (3,) with RGB colors.
+
+        Note:
+            See get_palette_indices for how values are mapped to colors.
+        '''
+        palette, indices = self.get_palette_indices(values, n_colors)
+        return palette[indices]
+
 
 class BWGradient(RGBGradient):
     def __init__(self, interval, *args, **kwargs):
@@ -71,6 +289,8 @@ class BWGradient(RGBGradient):
         self.interval = interval
         self.rgb1 = (0.2, 0.2, 0.2)
         self.rgb2 = (0.9, 0.9, 0.9)
+        self.min_value = None
+        self.max_value = None
 
     def get_color(self, value):
         if value < self.interval[0]:
@@ -82,6 +302,16 @@ class BWGradient(RGBGradient):
             dv = 1
         return (dv, dv, dv)
 
+    def _interpolate(self, dv):
+        dv = numpy.minimum(dv, 1)
+        return numpy.repeat(dv[..., numpy.newaxis], 3, axis=-1)
+
+
+def _format_css_colors(rgb):
+    '''Format an (N, 3) integer array of RGB colors as CSS colors.'''
+    packed = (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+    return ['#%06x' % c for c in packed.tolist()]
+
 
 # slightly hackish, but ...
 class GradientPlotter(BasePlotter):
@@ -1,66 +1,305 @@
 from __future__ import division
-from brp.svg.et_import import ET
-from math import log10
+from math import floor, frexp, log, log10
+
+import numpy
+
+from brp.core.binning import bin_data_1d, BIN_CHUNK_SIZE
+from brp.core.columns import open_column
 from brp.svg.plotters.base import BasePlotter
 
 
-def bin_data(lx, n_bins, normed=False):
+def _binned_data(bin_edges, bin_values, normed):
+    '''
+    Convert bin edges and values (NumPy arrays) to the binned data format.
+    '''
+    if normed:
+        max_value = bin_values.max()
+        if max_value > 0:
+            bin_values = bin_values / max_value
+    return list(zip(bin_edges[:-1].tolist(), bin_edges[1:].tolist(),
+                    bin_values.tolist()))
+
+
+def bin_data(lx, n_bins, normed=False, weights=None):
     '''
     Bin histogram data.
 
+    Arguments:
+
+        * `lx` -- Sequence or NumPy array of data, or a .npy file name or raw
+          buffer (read in chunks, see brp.core.columns.open_column).
+        * `n_bins` -- Number of bins.
+        * `normed` -- Boolean, if True the bin values are scaled such that the
+          highest bin has value 1, default False.
+        * `weights` -- Optional sequence or NumPy array of weights, one per
+          data point, default None (every data point counts as 1).
+
     Note: Binned data is [(x_min1, x_max1, val1), ..., (x_min2, x_max2, val2)]
+    See brp.core.binning.bin_data_1d for the binning itself.
     '''
-    m = min(lx)
-    M = max(lx)
-
-    # TODO XXX : remove this hack:
-    if m == M:
-        tmp = abs(m)
-        if tmp > 0:
-            pot = int(log10(tmp))
-            delta = 10 ** (pot - 1)
-        else:  # in case interval[0] == 0
-            delta = 0.1
-        m = m - delta
-        M = M + delta
-
-    interval = (M - m)
-    # n_bins - 1, because you want 0.5 bins 'overhang' at either end of the
-    # histogram.
-    bin_width = interval / (n_bins - 1)
-    bin_edges = [m + (i - 0.5) * bin_width for i in range(n_bins + 1)]
-    bin_values = [0 for i in range(n_bins)]
-
-    for x in lx:
-        index = int((x - m) / bin_width)
-        try:
-            bin_values[index] += 1
-        except IndexError:
-            bin_values[-1] += 1
+    bin_edges, bin_values = bin_data_1d(lx, n_bins, weights)
+    return _binned_data(bin_edges, bin_values, normed)
 
-    if normed:
-        factor = 1 / max(bin_values)
-        for i in range(n_bins):
-            bin_values[i] /= factor
 
-    return [(bin_edges[i], bin_edges[i + 1], bin_values[i])
-            for i in range(n_bins)]
+def bin_data_log(lx, n_bins, normed=False, weights=None):
+    '''
+    Bin data with logarithmically sized bins.
+
+    See bin_data, non-positive data is ignored.
+    '''
+    bin_edges, bin_values = bin_data_1d(lx, n_bins, weights, log=True)
+    return _binned_data(bin_edges, bin_values, normed)
 
 
-def bin_data_log(lx, n_bins, normed=False):
+class HistogramAccumulator(object):
     '''
-    Bin data with logarithmically sized bins.
+    1d histogram that is filled a chunk of data at a time.
+
+    With a fixed range the bins are known up front and data outside of the
+    range is counted in the `underflow` and `overflow` attributes. Without
+    one (adaptive range) the bin width is a power of two and the bins start
+    at a multiple of it. When data falls outside of the bins the bin width
+    is doubled, merging bins, until all data fits. Memory use thus stays at
+    `n_bins` bins, the data spans at least about half of them and the bins
+    do not depend on the order in which the data arrives (unless the first
+    chunk holds a single distinct value, the bins then start out about a
+    thousandth of that value wide).
+
+    Accumulators filled separately (for instance in other processes) can be
+    merged if they have the same number of bins, range and log setting.
+    Adaptive accumulators line up exactly after doubling to a common bin
+    width.
+
+    >>> from brp.svg.plotters.histogram import HistogramAccumulator
+    >>> acc = HistogramAccumulator(4, x_range=(0, 4))
+    >>> acc.add([0, 1, 1, 3.5, 4, 7])
+    >>> acc.bin_values.tolist(), acc.overflow
+    ([1, 2, 0, 2], 1)
+    >>> acc = HistogramAccumulator(4)
+    >>> acc.add([1, 2])
+    >>> acc.add([6])
+    >>> acc.histogram()[0].tolist(), acc.histogram()[1].tolist()
+    ([0.0, 2.0, 4.0, 6.0, 8.0], [1, 1, 0, 1])
     '''
-    # Just take the logarithm of all data points and call the normal binning
-    # function, and fix the bin edges thereafter.
-    log_lx = [log10(x) for x in lx]
-    log_bins = bin_data(log_lx, n_bins, normed)
+    def __init__(self, n_bins, x_range=None, log=False):
+        '''
+        Arguments:
+
+            * `n_bins` -- Number of bins (at least 2).
+            * `x_range` -- Optional tuple (lower, upper), the fixed range of
+              the histogram. Default None (adaptive range).
+            * `log` -- Boolean, if True the bins are logarithmically sized
+              (and non-positive data is ignored), default False.
+        '''
+        if n_bins < 2:
+            raise ValueError('A HistogramAccumulator needs at least 2 bins.')
+        self.n_bins = n_bins
+        self.log = log
+        self.x_range = x_range
+        # Integer counts, until weights are added.
+        self.bin_values = numpy.zeros(n_bins, dtype=numpy.int_)
+        self.underflow = 0
+        self.overflow = 0
+        # Smallest and largest (log10 if log is True) value seen.
+        self._min = None
+        self._max = None
+        if x_range is not None:
+            lower, upper = x_range
+            if log:
+                lower, upper = log10(lower), log10(upper)
+            if not lower < upper:
+                raise ValueError('The histogram range is empty.')
+            self._lower = lower
+            self._bin_width = (upper - lower) / n_bins
+        else:
+            # Bin i covers [(first + i) * 2 ** exponent,
+            # (first + i + 1) * 2 ** exponent), set by the first data.
+            self._exponent = None
+            self._first = None
+
+    def add(self, lx, weights=None):
+        '''
+        Add a chunk of data.
 
-    bins = []
-    for x1, x2, v in log_bins:
-        bins.append((10 ** x1, 10 ** x2, v))
+        Arguments:
 
-    return bins
+            * `lx` -- Sequence or NumPy array of data, or a .npy file name or
+              raw buffer (see brp.core.columns.open_column). Non finite data
+              is ignored.
+            * `weights` -- Optional sequence or NumPy array of weights, one
+              per data point. If not provided every data point counts as 1.
+        '''
+        lx = numpy.asarray(open_column(lx))
+        if weights is not None:
+            weights = numpy.asarray(open_column(weights))
+            assert weights.shape == lx.shape
+            if self.bin_values.dtype.kind != 'f':
+                self.bin_values = self.bin_values.astype(numpy.float64)
+        for start in range(0, len(lx), BIN_CHUNK_SIZE):
+            s = slice(start, start + BIN_CHUNK_SIZE)
+            self._add_chunk(lx[s], None if weights is None else weights[s])
+
+    def _add_chunk(self, x, weights):
+        x = numpy.asarray(x, dtype=numpy.float64)
+        with numpy.errstate(invalid='ignore'):
+            mask = numpy.isfinite(x)
+            if self.log:
+                mask &= x > 0
+        if not mask.all():
+            x = x[mask]
+            if weights is not None:
+                weights = weights[mask]
+        if not len(x):
+            return
+        if self.log:
+            x = numpy.log10(x)
+        m = x.min().item()
+        M = x.max().item()
+        self._min = m if self._min is None else min(self._min, m)
+        self._max = M if self._max is None else max(self._max, M)
+
+        if self.x_range is not None:
+            upper = self._lower + self.n_bins * self._bin_width
+            below = x < self._lower
+            above = x > upper
+            if weights is None:
+                self.underflow += int(below.sum())
+                self.overflow += int(above.sum())
+            else:
+                self.underflow += weights[below].sum().item()
+                self.overflow += weights[above].sum().item()
+            inside = ~(below | above)
+            x = x[inside]
+            if weights is not None:
+                weights = weights[inside]
+            index = ((x - self._lower) / self._bin_width).astype(numpy.intp)
+        else:
+            self._fit(self._min, self._max)
+            bin_width = 2.0 ** self._exponent
+            index = (numpy.floor(x / bin_width) -
+                     self._first).astype(numpy.intp)
+        # Values on the upper edge (or pushed over it by rounding) go in the
+        # last bin.
+        numpy.clip(index, 0, self.n_bins - 1, out=index)
+        values = numpy.bincount(index, weights=weights,
+                                minlength=self.n_bins)
+        self.bin_values += values.astype(self.bin_values.dtype)
+
+    def _fitting_exponent(self, m, M, exponent=None):
+        '''
+        Smallest exponent (not below `exponent`) of the bin width at which
+        the values from m to M fit in the bins.
+        '''
+        if M > m:
+            # The values span more than n_bins - 1 bins of a smaller width.
+            lowest = int(floor(log((M - m) / (self.n_bins + 1), 2)))
+        else:
+            # A single value, start with bins of about a thousandth of it.
+            lowest = frexp(abs(m))[1] - 10
+        if exponent is None or exponent < lowest:
+            exponent = lowest
+        while (floor(M / 2.0 ** exponent) - floor(m / 2.0 ** exponent) >=
+               self.n_bins):
+            exponent += 1
+        return exponent
+
+    def _rebinned(self, values, first, exponent, new_first, new_exponent):
+        '''Bin values (of an adaptive accumulator) with wider bins.'''
+        shift = new_exponent - exponent
+        # Python integers, floor division also for negative bin numbers.
+        index = [((first + i) >> shift) - new_first
+                 for i in range(self.n_bins)]
+        index = numpy.array(index, dtype=numpy.intp)
+        # Bins outside of the new range lie outside of the data (empty).
+        keep = (index >= 0) & (index < self.n_bins)
+        rebinned = numpy.zeros(self.n_bins, dtype=values.dtype)
+        numpy.add.at(rebinned, index[keep], values[keep])
+        return rebinned
+
+    def _fit(self, m, M, exponent=None):
+        '''Widen the bins (adaptive range) until m to M fit.'''
+        if self._exponent is not None and (exponent is None or
+                                           exponent < self._exponent):
+            exponent = self._exponent
+        exponent = self._fitting_exponent(m, M, exponent)
+        first = int(floor(m / 2.0 ** exponent))
+        if self._exponent is not None and (first, exponent) != (
+                self._first, self._exponent):
+            self.bin_values = self._rebinned(self.bin_values, self._first,
+                                             self._exponent, first, exponent)
+        self._first = first
+        self._exponent = exponent
+
+    def merge(self, other):
+        '''
+        Add the data of another HistogramAccumulator (in place).
+
+        Returns:
+            This HistogramAccumulator.
+        '''
+        if (other.n_bins != self.n_bins or other.log != self.log or
+                other.x_range != self.x_range):
+            raise ValueError('Only HistogramAccumulators with the same '
+                             'number of bins, range and log setting can '
+                             'be merged.')
+        if other.bin_values.dtype.kind == 'f':
+            self.bin_values = self.bin_values.astype(numpy.float64)
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        if other._min is None:
+            return self
+        values = other.bin_values
+        if self.x_range is None:
+            m = other._min if self._min is None else min(self._min,
+                                                         other._min)
+            M = other._max if self._max is None else max(self._max,
+                                                         other._max)
+            self._fit(m, M, other._exponent)
+            values = self._rebinned(values, other._first, other._exponent,
+                                    self._first, self._exponent)
+        self._min = other._min if self._min is None else min(self._min,
+                                                             other._min)
+        self._max = other._max if self._max is None else max(self._max,
+                                                             other._max)
+        self.bin_values += values.astype(self.bin_values.dtype)
+        return self
+
+    def histogram(self):
+        '''
+        The bins of the histogram, with an adaptive range only those from
+        the smallest to the largest value seen.
+
+        Returns:
+            A tuple (bin_edges, bin_values) of NumPy arrays, like
+            brp.core.binning.bin_data_1d.
+        '''
+        if self.x_range is not None:
+            bin_edges = (self._lower +
+                         numpy.arange(self.n_bins + 1) * self._bin_width)
+            bin_values = self.bin_values
+        else:
+            if self._min is None:
+                raise ValueError('No (finite) data to bin.')
+            bin_width = 2.0 ** self._exponent
+            n = int(floor(self._max / bin_width)) - self._first + 1
+            bin_edges = (self._first + numpy.arange(n + 1)) * bin_width
+            bin_values = self.bin_values[:n]
+        if self.log:
+            bin_edges = 10 ** bin_edges
+        return bin_edges, bin_values.copy()
+
+    def binned_data(self, normed=False):
+        '''
+        The histogram in the binned data format of bin_data (input for
+        HistogramPlotter).
+
+        Arguments:
+
+            * `normed` -- Boolean, if True the bin values are scaled such
+              that the highest bin has value 1, default False.
+        '''
+        bin_edges, bin_values = self.histogram()
+        return _binned_data(bin_edges, bin_values, normed)
 
 
 def merge_bins(bins):
@@ -84,6 +323,14 @@ def make_y_log_safe(binned_data):
 
 class HistogramPlotter(BasePlotter):
     def __init__(self, binned_data, data_range=True, **kwargs):
+        '''
+        Arguments:
+
+            * `binned_data` -- Binned data as returned by bin_data, or a
+              HistogramAccumulator.
+        '''
+        if isinstance(binned_data, HistogramAccumulator):
+            binned_data = binned_data.binned_data()
         # THIS CLASS WAS ORIGINALLY ONLY MEANT TO PLOT HORIZONTAL HISTOGRAMS
         # CURRENTLY IT DOES ALSO VERTICAL ONES (THROUGH A HACK)
         self.orientation = kwargs.get('orientation', 'horizontal')
@@ -127,65 +374,43 @@ class HistogramPlotter(BasePlotter):
 
     def draw(self, root_element, x_transform, y_transform):
         L = len(self.binned_data)
-        # Still needs the optimization for line segments that extend each other
-        # (those need to be merged).
+        # Transform all bin edges and bin values in one go.
+        x1s, x2s, ys = numpy.array(self.binned_data, dtype=numpy.float64).T
+        if self.orientation == 'horizontal':
+            t_edges1 = x_transform(x1s).tolist()
+            t_edges2 = x_transform(x2s).tolist()
+            t_values = y_transform(ys).tolist()
+
+            def point(i_edge, edges, i_value):
+                return edges[i_edge], t_values[i_value]
+        else:
+            t_edges1 = y_transform(x1s).tolist()
+            t_edges2 = y_transform(x2s).tolist()
+            t_values = x_transform(ys).tolist()
+
+            def point(i_edge, edges, i_value):
+                return t_values[i_value], edges[i_edge]
+
+        # Line segments that extend each other are merged by the encoder.
+        pieces = []
         points = []
         for i in range(L):
             if i == 0:
-                x1, x2, y = self.binned_data[0]
-                if self.orientation == 'horizontal':
-                    points.append('%.2f,%.2f' % (x_transform(x1),
-                                  y_transform(y)))
-                else:
-                    points.append('%.2f,%.2f' % (x_transform(y),
-                                  y_transform(x1)))
+                points.append(point(0, t_edges1, 0))
             else:
                 x1, x2, y = self.binned_data[i]
                 previous_x1, previous_x2, previous_y = self.binned_data[i - 1]
                 if x1 == previous_x2:
-                    if self.orientation == 'horizontal':
-                        points.append('%.2f,%.2f' % (x_transform(x1),
-                                      y_transform(previous_y)))
-                        if y != previous_y:
-                            points.append('%.2f,%.2f' % (x_transform(x1),
-                                          y_transform(y)))
-                    else:
-                        points.append('%.2f,%.2f' % (x_transform(previous_y),
-                                                     y_transform(x1)))
-                        if y != previous_y:
-                            points.append('%.2f,%.2f' % (x_transform(y),
-                                          y_transform(x1)))
+                    points.append(point(i, t_edges1, i - 1))
+                    if y != previous_y:
+                        points.append(point(i, t_edges1, i))
                 else:  # a 'break' in the histogram
-                    if self.orientation == 'horizontal':
-                        points.append('%.2f,%.2f' % (x_transform(previous_x2),
-                                      y_transform(previous_y)))
-                    else:
-                        points.append('%.2f,%.2f' % (x_transform(previous_y),
-                                      y_transform(previous_x2)))
-                    pl = ET.SubElement(root_element, 'polyline')
-                    pl.set('stroke', self.color)
-                    pl.set('fill', 'none')
-                    pl.set('points', ' '.join(points))
-                    if self.line_pattern:
-                        pl.set('style', 'stroke-dasharray:%s' %
-                               self.line_pattern)
-                    if self.orientation == 'horizontal':
-                        points = ['%.2f,%.2f' % (x_transform(x1),
-                                  y_transform(y))]
-                    else:
-                        points = ['%.2f,%.2f' % (x_transform(y),
-                                  y_transform(x1))]
+                    points.append(point(i - 1, t_edges2, i - 1))
+                    pieces.append(zip(*points))
+                    points = [point(i, t_edges1, i)]
             if i == L - 1:
-                x1, x2, y = self.binned_data[-1]
-                if self.orientation == 'horizontal':
-                    points.append('%.2f,%.2f' % (x_transform(x2),
-                                  y_transform(y)))
-                else:
-                    points.append('%.2f,%.2f' % (x_transform(y),
-                                  y_transform(x2)))
-                pl = ET.SubElement(root_element, 'polyline')
-                pl.set('stroke', self.color)
-                pl.set('fill', 'none')
-                pl.set('points', ' '.join(points))
-                if self.line_pattern:
-                    pl.set('style', 'stroke-dasharray:%s' % self.line_pattern)
+                points.append(point(L - 1, t_edges2, L - 1))
+                pieces.append(zip(*points))
+        # All pieces of the outline go in one path.
+        self.encoder.add_path(root_element, pieces, stroke=self.color,
+                              fill='none', dasharray=self.line_pattern)
@@ -2,37 +2,121 @@
 Implementation of LinePlots.
 '''
 from __future__ import division
-import StringIO
 from itertools import izip
-from base64 import encodestring
 
+import numpy
 from PIL import Image, ImageDraw
 
-from brp.svg.et_import import ET
-from brp.svg.plotters.scatter import ScatterPlotter
+from brp.svg.plotters.scatter import ScatterPlotter, MarkerRaster
+from brp.svg.plotters.scatter import ChunkedScatterPlotter
+from brp.svg.plotters.scatter import DRAW_CHUNK_SIZE
+from brp.svg.plotters.raster import add_image
 from brp.svg.colornames import svg_color2rgba_color
+from brp.core.decimate import m4_indices
+from brp.core.clip import clip_polyline, sorted_range
 
 
 class LinePlotter(ScatterPlotter):
     '''Line plot, implements BasePlotter interface.'''
     def __init__(self, *args, **kwargs):
+        '''
+        Keyword arguments:
+
+            * `decimate` --- Boolean, if True the line is reduced to the
+              first, minimum, maximum and last vertex per pixel column
+              before drawing (see brp.core.decimate), this gives the same
+              picture for x-sorted data with many vertices per pixel.
+              Markers are not affected. Default False.
+
+        See ScatterPlotter for the other keyword arguments.
+        '''
         self.line_pattern = kwargs.get('linepattern', '')
         self.use_markers = kwargs.get('use_markers', True)
+        self.decimate = kwargs.get('decimate', False)
 
         super(LinePlotter, self).__init__(*args, **kwargs)
 
+    def estimate_size(self):
+        '''Estimate the size of the SVG output (polyline plus markers).'''
+        n_elements = 1
+        # A path element without points is about 60 bytes, each point adds
+        # at most about 14 bytes (relative moves are usually shorter).
+        n_bytes = 60 + 14 * self._n_points()
+        if self.use_markers:
+            markers = super(LinePlotter, self).estimate_size()
+            n_elements += markers[0]
+            n_bytes += markers[1]
+        return n_elements, n_bytes
+
+    def _vertex_range(self):
+        '''Slice with the vertices that are needed to draw the line.'''
+        if self.view_bbox is not None and self._is_x_sorted():
+            # Only the vertices in the visible x range and their neighbours
+            # (for the segments entering and leaving) are needed.
+            return sorted_range(self.datapoints[0], self.view_bbox[0],
+                                self.view_bbox[2], pad=1)
+        return slice(None)
+
+    def _vertex_chunks(self):
+        '''
+        Split the needed vertices (see _vertex_range) in slices of at most
+        DRAW_CHUNK_SIZE + 1 vertices, consecutive slices share a vertex so
+        that no segment is lost.
+        '''
+        start, stop, step = self._vertex_range().indices(
+            len(self.datapoints[0]))
+        for first in range(start, max(stop - 1, start + 1), DRAW_CHUNK_SIZE):
+            yield slice(first, min(first + DRAW_CHUNK_SIZE + 1, stop))
+
+    def _transformed_pieces(self, x_transform, y_transform, clip=True,
+                            selection=None):
+        '''
+        Transform the vertices of the visible part of the line.
+
+        Arguments:
+
+            * `x_transform` -- Transform for the x coordinates.
+            * `y_transform` -- Transform for the y coordinates.
+            * `clip` -- Boolean, if True the line is clipped to the visible
+              data bounding box (which can split it in several pieces).
+            * `selection` -- Optional slice, the vertices to transform
+              (default all that are needed, see _vertex_range).
+
+        Returns:
+            List of (tx, ty) tuples of NumPy arrays, one per piece of the
+            line (decimated if requested).
+        '''
+        if selection is None:
+            selection = self._vertex_range()
+        tx = x_transform(self.datapoints[0][selection])
+        ty = y_transform(self.datapoints[1][selection])
+
+        pieces = [(tx, ty)]
+        if clip and self.view_bbox is not None:
+            x_min, y_min, x_max, y_max = self.view_bbox
+            sx = sorted([x_transform(x_min), x_transform(x_max)])
+            sy = sorted([y_transform(y_min), y_transform(y_max)])
+            with numpy.errstate(invalid='ignore'):
+                outside = ((tx < sx[0]) | (tx > sx[1]) |
+                           (ty < sy[0]) | (ty > sy[1]))
+            if outside.any():
+                pieces = clip_polyline(tx, ty, (sx[0], sy[0], sx[1], sy[1]))
+
+        if self.decimate:
+            decimated = []
+            for px, py in pieces:
+                idx = m4_indices(px, py)
+                decimated.append((px[idx], py[idx]))
+            pieces = decimated
+        return pieces
+
     def draw(self, root_element, x_transform, y_transform):
         '''Draw line plot.'''
 
-        pl = ET.SubElement(root_element, 'polyline')
-        pl.set('stroke', self.color)
-        pl.set('fill', 'none')
-        points = []
-        for x, y in zip(self.datapoints[0], self.datapoints[1]):
-            points.append("%.2f,%.2f" % (x_transform(x), y_transform(y)))
-        pl.set('points', ' '.join(points))
-        if self.line_pattern:
-            pl.set('style', 'stroke-dasharray: %s' % self.line_pattern)
+        pieces = self._transformed_pieces(x_transform, y_transform)
+        if pieces:
+            self.encoder.add_path(root_element, pieces, stroke=self.color,
+                                  fill='none', dasharray=self.line_pattern)
 
         if self.use_markers:
             super(LinePlotter, self).draw(root_element, x_transform,
@@ -48,30 +132,83 @@ class LinePlotter(ScatterPlotter):
         im = Image.new('RGBA', (width, height), (255, 255, 255, 0))
         imdraw = ImageDraw.Draw(im)
         rgba_color = svg_color2rgba_color(self.color)
+        markers = None
+        if self.use_markers:
+            markers = MarkerRaster(self, width, height)
 
         # above should be hidden (not re-implemented in each subclass)
-        if len(self.datapoints) > 1:
-            tmp = []
-            for datapoint in izip(*self.datapoints):
-                x = x_transform(datapoint[0])
-                y = y_transform(datapoint[1])
-                tmp.append(x)
-                tmp.append(y)
-            imdraw.line(tmp, fill=rgba_color, width=1)
+        # The parts of the data share a vertex, so no segment is lost (the
+        # marker drawn twice looks the same).
+        for repeated in self._parts(overlap=1):
+            if len(self.datapoints) > 1:
+                # PIL clips the line itself. The vertices are read in
+                # chunks, so that data on disk is not loaded into memory as
+                # a whole.
+                for selection in self._vertex_chunks():
+                    for tx, ty in self._transformed_pieces(
+                            x_transform, y_transform, False, selection):
+                        imdraw.line(list(izip(tx.tolist(), ty.tolist())),
+                                    fill=rgba_color, width=1)
+            if markers is not None:
+                markers.add(x_transform, y_transform)
         # below should be hidden (not re-implemented in each subclass)
 
-        tmp = StringIO.StringIO()
-        im.save(tmp, format='png')
-        encoded_png = 'data:image/png;base64,\n' + encodestring(tmp.getvalue())
+        add_image(root_element, im, svg_bbox)
+        if markers is not None:
+            add_image(root_element, markers.image(), svg_bbox)
+
 
-        img = ET.SubElement(root_element, 'image')
-        img.set('xlink:href', encoded_png)
-        img.set('x', '%.2f' % min(svg_bbox[0], svg_bbox[2]))
-        img.set('y', '%.2f' % min(svg_bbox[1], svg_bbox[3]))
-        img.set('width', '%.2f' % width)
-        img.set('height', '%.2f' % height)
-        img.set('preserveAspectRatio', 'none')
+class ChunkedLinePlotter(ChunkedScatterPlotter, LinePlotter):
+    '''
+    Line plot of data that arrives in chunks, see ChunkedScatterPlotter.
 
+    The last vertex of a chunk is connected to the first vertex of the next
+    chunk. When drawing SVG elements the (decimated, if so requested)
+    vertices of the visible part of the line are kept until the path is
+    complete, the data itself is read a chunk at a time.
+    '''
+    def __init__(self, source, **kwargs):
+        '''
+        See LinePlotter and ChunkedScatterPlotter for the arguments.
+        '''
+        super(ChunkedLinePlotter, self).__init__(source, **kwargs)
+
+    def draw(self, root_element, x_transform, y_transform):
+        '''Draw line plot, a chunk of data at a time.'''
+        # The path goes below the markers, it is added when it is complete.
+        index = len(root_element)
         if self.use_markers:
-            super(LinePlotter, self).rdraw(root_element, x_transform,
-                                           y_transform, svg_bbox)
+            symbols = self._svg_symbols(root_element)
+            points_element = self._points_element(root_element)
+        # Lists of (tx, ty) tuples, each list is a piece of the line.
+        runs = []
+        n_culled = 0
+        for repeated in self._parts(overlap=1):
+            pieces = self._transformed_pieces(x_transform, y_transform)
+            if repeated and runs and pieces:
+                # Continue the line where the previous chunk left off.
+                tx, ty = pieces[0]
+                last_x, last_y = runs[-1][-1]
+                if tx[0] == last_x[-1] and ty[0] == last_y[-1]:
+                    runs[-1].append((tx[1:], ty[1:]))
+                    pieces = pieces[1:]
+            runs.extend([piece] for piece in pieces)
+
+            if self.use_markers:
+                # The repeated vertex already has its marker.
+                self.datapoints = [column[repeated:] for column in
+                                   self.datapoints]
+                self._draw_points(points_element, x_transform,
+                                  y_transform, symbols)
+                n_culled += self.n_culled
+        self.n_culled = n_culled
+
+        if runs:
+            pieces = [(numpy.concatenate([tx for tx, ty in run]),
+                       numpy.concatenate([ty for tx, ty in run]))
+                      for run in runs]
+            p = self.encoder.add_path(root_element, pieces, stroke=self.color,
+                                      fill='none',
+                                      dasharray=self.line_pattern)
+            root_element.remove(p)
+            root_element.insert(index, p)
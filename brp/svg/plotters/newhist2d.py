@@ -4,16 +4,17 @@ Refactor of the 2d histogramming in brp.
 # TODO : Check that histogram with single counts get colored correctly
 # there might an off by one in the color mapping.
 from __future__ import division
-import StringIO
-from base64 import encodestring
 
 import numpy
-import Image
+from PIL import Image
 
 from brp.core.bbox import find_bounding_box
-from brp.svg.plotters.raster import RasterPlotterMixin
+from brp.core.binning import bin_data_2d
+from brp.core.columns import open_column
+from brp.svg.plotters.raster import RasterPlotterMixin, png_data_url
 from brp.svg.plotters.gradient import RGBGradient
 from brp.svg.plotters.base import BasePlotter
+from brp.svg.imagecache import IMAGE_CACHE, image_key
 
 
 
@@ -23,11 +24,7 @@ def get_data_url(ar, gradient):
     Color code array according to gradient and turn into data url.
     '''
     colors = colorcode(ar, gradient)
-    img = make_image(colors)
-    buffer = StringIO.StringIO()
-    img.save(buffer, format='png')
-
-    return 'data:image/png;base64,\n' + encodestring(buffer.getvalue())
+    return png_data_url(make_image(colors))
 
 
 def make_image(colors):
@@ -46,39 +43,19 @@ def colorcode(ar, gradient):
     Color code a 2d array according to the provided gradient.
     '''
     assert len(ar.shape) == 2
-    shape = ar.shape
-    colors = numpy.zeros((shape[0], shape[1], 3), dtype=numpy.uint8)
-
-    for ix in range(shape[0]):
-        for iy in range(shape[1]):
-            r, g, b = gradient.get_color(ar[ix, iy])
-            colors[ix, iy] = (r * 255, g * 255, b * 255)
-    return colors
-
-
-def bin_data_2d(x_seq, y_seq, x_bins, y_bins, hist_bbox):
-    '''
-    Create a 2d histogram.
-    '''
-    ar = numpy.zeros((x_bins, y_bins), dtype=numpy.int_)
-    dw = (hist_bbox[2] - hist_bbox[0]) / x_bins
-    dh = (hist_bbox[3] - hist_bbox[1]) / y_bins
-    for x, y in zip(x_seq, y_seq):
-        if not (hist_bbox[0] <= x < hist_bbox[2]):
-            continue
-        if not hist_bbox[1] <= y < hist_bbox[3]:
-            continue
-        x_idx = int((x - hist_bbox[0]) / dw)
-        y_idx = int((y - hist_bbox[1]) / dh)
-        ar[x_idx, y_idx] += 1
-    return ar
+    return gradient.colorcode(ar)
 
 
 class Array2dPlotter(RasterPlotterMixin):
+    raster_output = True
+
     def __init__(self, ar, ar_bbox, *args, **kwargs):
         self.array = ar
         self.img_bbox = ar_bbox
         self.gradient = kwargs.get('gradient', None)
+        # brp.svg.imagecache.ImageCache for the encoded image, None to
+        # encode it on every draw.
+        self.image_cache = kwargs.get('image_cache', IMAGE_CACHE)
 
     # TODO: check the following for switched x and y
     def collapse_x(self, *args, **kwargs):
@@ -107,7 +84,14 @@ class Array2dPlotter(RasterPlotterMixin):
             return self.gradient
 
     def draw(self, *args, **kwargs):
-        self.encoded_png = get_data_url(self.array, self.get_gradient())
+        gradient = self.get_gradient()
+        if self.image_cache is None:
+            self.encoded_png = get_data_url(self.array, gradient)
+        else:
+            # The PNG has one pixel per array element.
+            key = image_key(self.array, gradient, self.array.shape[:2])
+            self.encoded_png = self.image_cache.get(
+                key, lambda: get_data_url(self.array, gradient))
         super(Array2dPlotter, self).draw(*args, **kwargs)
 
 
@@ -115,12 +99,22 @@ class Histogram2dPlotter(Array2dPlotter):
     def __init__(self, x_seq, y_seq, *args, **kwargs):
         x_bins = kwargs.get('x_bins', 10)
         y_bins = kwargs.get('y_bins', 10)
+        weights = kwargs.get('weights', None)
+        # Data on disk (.npy files, memory maps) is read in chunks.
+        x_seq = open_column(x_seq)
+        y_seq = open_column(y_seq)
+        if weights is not None:
+            weights = open_column(weights)
         # First pass through data, find the range of values:
-        bbox = kwargs.get('hist_bbox', find_bounding_box(x_seq, y_seq))
+        if 'hist_bbox' in kwargs:
+            bbox = kwargs['hist_bbox']
+        else:
+            bbox = find_bounding_box(x_seq, y_seq)
         # bounding box needs stretching!
         self.img_bbox = bbox
         # Second pass trough the data to create the histogram.
-        self.array = bin_data_2d(x_seq, y_seq, x_bins, y_bins, bbox)
+        self.array = bin_data_2d(x_seq, y_seq, x_bins, y_bins, bbox, weights)
         # Color code the data (on gray scale for now).
         # save the relevant information:
         self.gradient = kwargs.get('gradient', None)
+        self.image_cache = kwargs.get('image_cache', IMAGE_CACHE)
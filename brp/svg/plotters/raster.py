@@ -1,8 +1,34 @@
+import StringIO
+from base64 import encodestring
+
 from brp.svg.et_import import ET
 from brp.svg.plotters.base import BasePlotter
+from brp.svg.profile import phase
 from brp.core.bbox import combine_bbox
 
 
+def png_data_url(im):
+    '''Encode a PIL image as a (base64) PNG data URL.'''
+    with phase('png'):
+        tmp = StringIO.StringIO()
+        im.save(tmp, format='png')
+        return 'data:image/png;base64,\n' + encodestring(tmp.getvalue())
+
+
+def add_image(root_element, im, svg_bbox):
+    '''
+    Add a PIL image that covers `svg_bbox` as an SVG <image> element.
+    '''
+    img = ET.SubElement(root_element, 'image')
+    img.set('xlink:href', png_data_url(im))
+    img.set('x', '%.2f' % min(svg_bbox[0], svg_bbox[2]))
+    img.set('y', '%.2f' % min(svg_bbox[1], svg_bbox[3]))
+    img.set('width', '%.2f' % (svg_bbox[2] - svg_bbox[0]))
+    img.set('height', '%.2f' % (svg_bbox[1] - svg_bbox[3]))
+    img.set('preserveAspectRatio', 'none')
+    return img
+
+
 class RasterPlotterMixin(BasePlotter):
     def prepare_bbox(self, data_bbox=None):
         if data_bbox is not None:
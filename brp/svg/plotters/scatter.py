@@ -1,19 +1,28 @@
 '''
 Implementation of scatter plots.
 '''
-import copy
 from itertools import izip
-import StringIO
-from base64 import encodestring
 
+import numpy
 from PIL import Image, ImageDraw
 
 from brp.svg.et_import import ET
 from brp.svg.plotters.base import BasePlotter
-from brp.core.bbox import find_bounding_box
-from brp.svg.plotters.symbol import BaseSymbol
+from brp.core.bbox import find_bounding_box, combine_bbox
+from brp.core.columns import as_column, IndexedColumn
+from brp.core.cull import overplot_indices
+from brp.core.clip import is_sorted, sorted_range
+from brp.svg.plotters.symbol import BaseSymbol, instance_symbols
+from brp.svg.plotters.symbol import has_fixed_shape
+from brp.svg.plotters.symbol import set_instance_prefix, adapt_symbols
+from brp.svg.plotters.splat import splat
+from brp.svg.plotters.raster import add_image
 from brp.svg.colornames import svg_color2rgba_color
 
+# Number of data points that are rasterized at a time (bounds the memory
+# used when the data columns are memory-mapped files).
+DRAW_CHUNK_SIZE = 2 ** 16
+
 
 class FakeList(object):
     def __init__(self, something):
@@ -42,64 +51,369 @@ class ScatterPlotter(BasePlotter):
     args[1] -> Y
     args[2] -> color via the provided gradient (befaults to black)
     args[3->n] -> shape via BaseSymbol subclass
+
+    Each of the args can also be the name of a .npy file or a memory-mapped
+    array, it is then read from disk in chunks when the plot is drawn (see
+    brp.core.columns.as_column).
+
+    The bounding box of the data is cached between draws, replace the data
+    with set_data or call data_changed after changing it in place.
     '''
     def __init__(self, *args, **kwargs):
-        # Copy the datapoints.
-        if len(args) == 1:
-            self.datapoints = [[i for i in xrange(len(args[0]))]]
-            self.datapoints.append(copy.copy(args[0]))
-        else:
-            N = len(args[0])
-            for x in args:
-                assert len(x) == N
-            self.datapoints = copy.deepcopy(args)
+        '''
+        Keyword arguments:
+
+            * `copy` --- Boolean, if False the data columns that are already
+              contiguous NumPy arrays of the right data type are not copied
+              (they stay owned by the caller), default True.
+            * `dtype` --- NumPy data type used to store the data columns,
+              default numpy.float64 (numpy.float32 halves the memory used).
+            * `cull` --- Integer or None, if set draw() leaves out the data
+              points that are hidden below an identical data point (same
+              symbol and color) in the same cell of a grid with `cull`
+              cells per pixel. Data points with a link are always drawn.
+              The number of left out data points is stored in the
+              `n_culled` attribute. Default None (draw all data points).
+            * `x_sorted` --- Boolean or None, whether the data is sorted by x
+              (then the visible data points are found by binary search).
+              Default None (check the data the first time it is needed).
+            * `instancing` --- Boolean, if True symbols with a fixed shape
+              are defined once in a <defs> element and each data point is
+              drawn as a <use> element referring to it (this pays off for
+              symbols made of several elements, like the CrossHairSymbol).
+              Default False.
+        '''
+        self._copy = kwargs.get('copy', True)
+        self._dtype = kwargs.get('dtype', numpy.float64)
+        self.datapoints = self._columns(args)
+        N = len(self.datapoints[0])
         # Copy the color, possible gradient, links and symbol to use.
         self.gradient = kwargs.get('gradient', None)
         self.gradient_i = kwargs.get('gradient_i', None)
-        self.colors = kwargs.get('colors', [])
+        self.colors = IndexedColumn(kwargs.get('colors', []))
         if self.colors:
-            assert len(self.colors) == len(args[0])
+            assert len(self.colors) == N
         self.color = kwargs.get('color', 'black')
-        self.links = kwargs.get('links', [])
+        self.links = IndexedColumn(kwargs.get('links', []))
         if self.links:
-            assert len(self.links) == len(args[0])
+            assert len(self.links) == N
         symbol_classes = kwargs.get('symbols', [])
         if not symbol_classes:
             symbol_classes = [kwargs.get('symbol', BaseSymbol)]
         self.symbols = [s(self.color) for s in symbol_classes]
+        self.cull = kwargs.get('cull', None)
+        self.n_culled = 0
+        self._x_sorted_hint = kwargs.get('x_sorted', None)
+        self.x_sorted = self._x_sorted_hint
+        self.view_bbox = None
+        self.instancing = kwargs.get('instancing', False)
+
+    def _columns(self, args):
+        '''
+        Store the data columns `args` as contiguous NumPy arrays (opened
+        first, they can be .npy file names), numbered if only y is given.
+        '''
+        columns = [as_column(x, self._dtype, self._copy) for x in args]
+        N = len(columns[0])
+        for column in columns:
+            assert len(column) == N
+        if len(args) == 1:
+            columns.insert(0, numpy.arange(N, dtype=self._dtype))
+        return columns
+
+    def set_data(self, *args):
+        '''
+        Replace the data columns (the arguments are like those of the
+        constructor) and drop the cached bounding box.
+        '''
+        datapoints = self._columns(args)
+        N = len(datapoints[0])
+        if self.colors:
+            assert len(self.colors) == N
+        if self.links:
+            assert len(self.links) == N
+        self.datapoints = datapoints
+        self.data_changed()
+
+    def _n_points(self):
+        '''Number of data points.'''
+        return len(self.datapoints[0])
+
+    def _find_bbox(self):
+        '''Bounding box of the data of this scatter plot (None if empty).'''
+        return find_bounding_box(self.datapoints[0], self.datapoints[1],
+                                 None, self.x_log, self.y_log)
 
     def prepare_bbox(self, data_bbox):
         '''Update bounding box with the data for this scatter plot.'''
-        return find_bounding_box(self.datapoints[0], self.datapoints[1],
-                                 data_bbox)
+        # The bounding box of the data is found once (per axis type), until
+        # data_changed is called.
+        axes = (self.x_log, self.y_log)
+        if self._bbox_cache is None or self._bbox_cache[0] != axes:
+            self._bbox_cache = (axes, self._find_bbox())
+        bbox = self._bbox_cache[1]
+        if bbox is None:
+            return None if data_bbox is None else tuple(data_bbox)
+        if data_bbox is None:
+            return bbox
+        return combine_bbox(data_bbox, bbox)
+
+    def data_changed(self):
+        super(ScatterPlotter, self).data_changed()
+        self.x_sorted = self._x_sorted_hint
+
+    def estimate_size(self):
+        '''
+        Estimate the size of the SVG output by drawing the first data point.
+        '''
+        if not len(self.datapoints[0]):
+            return 0, 0
+        N = self._n_points()
+        kwargs = {}
+        if self.links:
+            kwargs['link'] = self.links[0]
+        if self.gradient and self.gradient_i is not None:
+            kwargs['color'] = '#000000'
+        elif self.colors:
+            kwargs['color'] = self.colors[0]
+        datapoint = [column[0] for column in self.datapoints]
+        # Typical SVG coordinates have 3 digits before the decimal point.
+        scratch = ET.Element('g')
+        # The (one time) symbol definitions are not counted, nor do they
+        # use up definition ids.
+        previous = set_instance_prefix('bs')
+        try:
+            for s in self._svg_symbols(ET.Element('g')):
+                s.draw_xy(scratch, 100.0, 100.0, *datapoint, **kwargs)
+        finally:
+            set_instance_prefix(*previous)
+        n_elements = len(scratch.findall('.//*'))
+        n_bytes = sum(len(ET.tostring(child)) for child in scratch)
+        return N * n_elements, N * n_bytes
+
+    def done_bbox(self, data_bbox, svg_bbox):
+        '''Remember the visible data bounding box (data is clipped to it).'''
+        self.view_bbox = data_bbox
+
+    def _is_x_sorted(self):
+        if self.x_sorted is None:
+            self.x_sorted = is_sorted(self.datapoints[0])
+        return self.x_sorted
+
+    def _candidates(self):
+        '''
+        Slice with the data points that can be inside the visible data
+        bounding box (found by binary search for x-sorted data).
+        '''
+        N = len(self.datapoints[0])
+        if self.view_bbox is not None and self._is_x_sorted():
+            return sorted_range(self.datapoints[0], self.view_bbox[0],
+                                self.view_bbox[2])
+        return slice(0, N)
+
+    def _inside(self, s):
+        '''
+        Boolean NumPy array, which of the data points in slice `s` are
+        inside the visible data bounding box.
+        '''
+        x_min, y_min, x_max, y_max = self.view_bbox
+        x, y = self.datapoints[0][s], self.datapoints[1][s]
+        with numpy.errstate(invalid='ignore'):
+            return (x >= x_min) & (x <= x_max) & (y >= y_min) & (y <= y_max)
+
+    def _visible(self):
+        '''
+        Select the data points inside the visible data bounding box.
+
+        Returns:
+            A slice or a NumPy array of indices.
+        '''
+        if self.view_bbox is None:
+            return slice(None)
+        selection = self._candidates()
+        inside = self._inside(selection)
+        if inside.all():
+            return selection
+        return selection.start + numpy.flatnonzero(inside)
+
+    def _visible_chunks(self):
+        '''
+        Select the data points inside the visible data bounding box in
+        chunks of at most DRAW_CHUNK_SIZE data points (in order), so that
+        data on disk is read a chunk at a time.
+
+        Returns:
+            Iterator over slices or NumPy arrays of indices.
+        '''
+        candidates = self._candidates()
+        for start in range(candidates.start, candidates.stop,
+                           DRAW_CHUNK_SIZE):
+            s = slice(start, min(start + DRAW_CHUNK_SIZE, candidates.stop))
+            if self.view_bbox is None:
+                yield s
+                continue
+            inside = self._inside(s)
+            if inside.all():
+                yield s
+            elif inside.any():
+                yield start + numpy.flatnonzero(inside)
+
+    @staticmethod
+    def _compose(selection, idx):
+        '''Apply selection `idx` (see _cull) to `selection` (see _visible).'''
+        if isinstance(idx, slice):
+            return selection
+        if isinstance(selection, slice):
+            return idx + (selection.start or 0)
+        return selection[idx]
+
+    def _cull(self, tx, ty, selection, screen=()):
+        '''
+        Find the data points to draw, see the `cull` keyword argument.
+
+        Arguments:
+
+            * `tx` -- NumPy array of transformed x coordinates.
+            * `ty` -- NumPy array of transformed y coordinates.
+            * `selection` -- Slice or NumPy array of indices, the data points
+              that `tx` and `ty` belong to.
+            * `screen` -- Sequence of NumPy arrays of other transformed
+              coordinates that determine what a data point looks like.
+
+        Returns:
+            NumPy array of indices into `tx` and `ty`, or a slice selecting
+            all of them.
+        '''
+        if not self.cull:
+            self.n_culled = 0
+            return slice(None)
+
+        exact = []
+        if self.gradient and self.gradient_i is not None:
+            rgba = self.gradient.get_rgba_colors(
+                self.datapoints[self.gradient_i][selection])
+            exact.append(numpy.ascontiguousarray(rgba).view(numpy.uint32))
+        elif self.colors:
+            exact.append(self.colors.indices[selection])
+        if not all(has_fixed_shape(s) for s in self.symbols):
+            # Symbol shape depends on the other data columns.
+            exact.extend(column[selection] for column in self.datapoints[2:])
+        keep = None
+        if self.links:
+            has_link = numpy.array([bool(l) for l in self.links.palette])
+            keep = has_link[self.links.indices[selection]]
+
+        indices = overplot_indices([tx, ty] + list(screen), exact,
+                                   self.cull, keep)
+        self.n_culled = len(tx) - len(indices)
+        return indices
+
+    def _svg_symbols(self, root_element):
+        '''Symbols to draw with (instanced if so requested).'''
+        if self.instancing:
+            return instance_symbols(self.symbols, root_element)
+        return self.symbols
 
     def draw(self, root_element, x_transform, y_transform):
         '''Draw scatter plot.'''
+        symbols = self._svg_symbols(root_element)
+        self._draw_points(self._points_element(root_element), x_transform,
+                          y_transform, symbols)
+
+    def _points_element(self, root_element):
+        '''
+        Element that receives the data points, a group with the color if
+        all data points have the same color.
+        '''
+        if (self.gradient and self.gradient_i is not None) or self.colors:
+            return root_element
+        g = ET.SubElement(root_element, 'g')
+        g.set('stroke', self.color)
+        g.set('fill', self.color)
+        return g
+
+    def _draw_points(self, root_element, x_transform, y_transform, symbols):
+        '''
+        Draw the (visible) data points with the symbols `symbols` in the
+        element returned by _points_element.
+        '''
+        # Symbols that override draw are drawn with it (see DrawAdapter).
+        symbols = adapt_symbols(symbols, x_transform, y_transform)
+        # Transform all the visible datapoints in one go.
+        selection = self._visible()
+        tx = x_transform(self.datapoints[0][selection])
+        ty = y_transform(self.datapoints[1][selection])
+        # Leave out the datapoints that are hidden by others.
+        idx = self._cull(tx, ty, selection)
+        selection = self._compose(selection, idx)
+        datapoints = [column[selection] for column in self.datapoints]
+        tx = tx[idx].tolist()
+        ty = ty[idx].tolist()
 
         if self.links:
-            L = self.links
+            L = self.links.take(selection)
         else:
             L = FakeList('')
 
         if self.gradient and self.gradient_i is not None:
-            for i, datapoint in enumerate(izip(*self.datapoints)):
-                for s in self.symbols:
-                    s.draw(root_element, x_transform, y_transform, *datapoint,
-                           color=self.gradient.get_css_color(
-                           datapoint[self.gradient_i]), link=L[i])
+            colors = self.gradient.get_css_colors(
+                datapoints[self.gradient_i])
+            for i, datapoint in enumerate(izip(*datapoints)):
+                for s in symbols:
+                    s.draw_xy(root_element, tx[i], ty[i], *datapoint,
+                              color=colors[i], link=L[i])
         elif self.colors:
-            for i, datapoint in enumerate(izip(*self.datapoints)):
-                for s in self.symbols:
-                    s.draw(root_element, x_transform, y_transform, *datapoint,
-                           color=self.colors[i], link=L[i])
+            colors = self.colors.take(selection)
+            for i, datapoint in enumerate(izip(*datapoints)):
+                for s in symbols:
+                    s.draw_xy(root_element, tx[i], ty[i], *datapoint,
+                              color=colors[i], link=L[i])
         else:
-            root_element = ET.SubElement(root_element, 'g')
-            root_element.set('stroke', self.color)
-            root_element.set('fill', self.color)
-            for i, datapoint in enumerate(izip(*self.datapoints)):
-                for s in self.symbols:
-                    s.draw(root_element, x_transform, y_transform, *datapoint,
-                           link=L[i])
+            for i, datapoint in enumerate(izip(*datapoints)):
+                for s in symbols:
+                    s.draw_xy(root_element, tx[i], ty[i], *datapoint,
+                              link=L[i])
+
+    def _rgba_colors(self, selection=slice(None)):
+        '''
+        Find the RGBA color(s) for the raster version of this scatter plot.
+
+        Arguments:
+
+            * `selection` -- Slice or NumPy array of indices, the data points
+              to find the colors for (default all).
+
+        Returns:
+            NumPy uint8 array of shape (N, 4) with a color per data point or
+            of shape (4,) if all data points have the same color.
+        '''
+        if self.gradient and self.gradient_i is not None:
+            return self.gradient.get_rgba_colors(
+                self.datapoints[self.gradient_i][selection])
+        elif self.colors:
+            # Convert each distinct color only once.
+            palette = numpy.array([svg_color2rgba_color(c) for c in
+                                   self.colors.palette], dtype=numpy.uint8)
+            return palette[self.colors.indices[selection]]
+        return numpy.array(svg_color2rgba_color(self.color),
+                           dtype=numpy.uint8)
+
+    def _parts(self, overlap=0):
+        '''
+        Go through the data in parts, self.datapoints holds each part in
+        turn. A ScatterPlotter has all its data in one part, see
+        ChunkedScatterPlotter.
+
+        Arguments:
+
+            * `overlap` -- Number of data points at the end of a part that
+              are repeated at the start of the next part (for lines).
+
+        Returns:
+            Iterator, yields the number of repeated data points at the start
+            of each part.
+        '''
+        yield 0
 
     def rdraw(self, root_element, x_transform, y_transform, svg_bbox):
 
@@ -108,39 +422,219 @@ class ScatterPlotter(BasePlotter):
         assert width > 0
         assert height > 0
 
-        im = Image.new('RGBA', (width, height), (255, 255, 255, 0))
-        imdraw = ImageDraw.Draw(im)
-
         # above should be hidden (not re-implemented in each subclass)
-        if self.gradient and self.gradient_i is not None:
-            for i, datapoint in enumerate(izip(*self.datapoints)):
-                rgba_color = self.gradient.get_rgba_color(
-                    datapoint[self.gradient_i])
-                for s in self.symbols:
-                    s.rdraw(imdraw, x_transform, y_transform, *datapoint,
-                            rgba_color=rgba_color)
-        elif self.colors:
-            for i, datapoint in enumerate(izip(*self.datapoints)):
-                for s in self.symbols:
-                    rgba_color = svg_color2rgba_color(self.colors[i])
-                    s.rdraw(imdraw, x_transform, y_transform, *datapoint,
-                            rgba_color=rgba_color)
-        else:
-            for datapoint in izip(*self.datapoints):
-                rgba_color = svg_color2rgba_color(self.color)
-                for s in self.symbols:
-                    s.rdraw(imdraw, x_transform, y_transform, *datapoint,
-                            rgba_color=rgba_color)
+        raster = MarkerRaster(self, width, height)
+        for repeated in self._parts():
+            raster.add(x_transform, y_transform)
         # below should be hidden (not re-implemented in each subclass)
 
-        tmp = StringIO.StringIO()
-        im.save(tmp, format='png')
-        encoded_png = 'data:image/png;base64,\n' + encodestring(tmp.getvalue())
-
-        img = ET.SubElement(root_element, 'image')
-        img.set('xlink:href', encoded_png)
-        img.set('x', '%.2f' % min(svg_bbox[0], svg_bbox[2]))
-        img.set('y', '%.2f' % min(svg_bbox[1], svg_bbox[3]))
-        img.set('width', '%.2f' % width)
-        img.set('height', '%.2f' % height)
-        img.set('preserveAspectRatio', 'none')
+        add_image(root_element, raster.image(), svg_bbox)
+
+
+class MarkerRaster(object):
+    '''
+    Raster image of the data points of a ScatterPlotter, the data points are
+    added a part (see ScatterPlotter._parts) at a time.
+    '''
+    def __init__(self, plotter, width, height):
+        self.plotter = plotter
+        self.width = width
+        self.height = height
+        self.sprites = [s.get_sprite() for s in plotter.symbols]
+        # All symbols look the same for every data point, stamp them.
+        self.stamp = all(sprite is not None for sprite in self.sprites)
+        self.buffer = None
+        if not self.stamp:
+            self.im = Image.new('RGBA', (width, height), (255, 255, 255, 0))
+            self.imdraw = ImageDraw.Draw(self.im)
+
+    def add(self, x_transform, y_transform):
+        '''Draw the visible data points of the current part.'''
+        plotter = self.plotter
+        datapoints = plotter.datapoints
+        for selection in plotter._visible_chunks():
+            if self.stamp:
+                self.buffer = splat(self.width, self.height, self.sprites,
+                                    x_transform(datapoints[0][selection]),
+                                    y_transform(datapoints[1][selection]),
+                                    plotter._rgba_colors(selection),
+                                    self.buffer, plotter.symbols)
+                continue
+            part = [column[selection] for column in datapoints]
+            rgba_colors = plotter._rgba_colors(selection)
+            if rgba_colors.ndim == 1:
+                rgba_colors = FakeList(tuple(rgba_colors.tolist()))
+            else:
+                rgba_colors = [tuple(c) for c in rgba_colors.tolist()]
+            for i, datapoint in enumerate(izip(*part)):
+                for s in plotter.symbols:
+                    s.rdraw(self.imdraw, x_transform, y_transform,
+                            *datapoint, rgba_color=rgba_colors[i])
+
+    def image(self):
+        '''The PIL image with the data points drawn so far.'''
+        if not self.stamp:
+            return self.im
+        if self.buffer is None:
+            # No visible data points.
+            return Image.new('RGBA', (self.width, self.height),
+                             (255, 255, 255, 0))
+        return Image.fromarray(self.buffer, 'RGBA')
+
+
+class ChunkedScatterPlotter(ScatterPlotter):
+    '''
+    Scatter plot of data that arrives in chunks (for instance batches of
+    records from a file reader), only one chunk is in memory at a time.
+
+    Without a known data range the data is read twice, once to find its
+    bounding box and once to draw it, the source of the chunks must then
+    be restartable. With a known data range (the `data_bbox` keyword
+    argument, or both the `x_range` and `y_range` of the PlotContainer)
+    the data is read once, while drawing.
+
+    Per data point colors and links are not supported (use a gradient), nor
+    is drawing with several processes when the source is an iterator.
+
+    The bounding box of the data is cached between draws, replace the
+    source with set_source or call data_changed when the data a restartable
+    source returns changes.
+    Culling (see ScatterPlotter) is done per chunk.
+    '''
+    def __init__(self, source, **kwargs):
+        '''
+        Arguments:
+
+            * `source` -- The chunks of data, each a sequence of columns like
+              the arguments of ScatterPlotter (x, y, ...). Either a function
+              without arguments that returns an iterable of chunks (the
+              source is restartable, it is called for every pass over the
+              data) or an iterable of chunks (it can only be read once).
+
+        Keyword arguments:
+
+            * `data_bbox` --- Bounding box of the data, like (xmin, ymin,
+              xmax, ymax). If provided the data is not read to find it.
+            * `n_points` --- Integer, total number of data points. If
+              provided (and the source is restartable) the size of the SVG
+              output is estimated from the first chunk, so that the plot
+              can be rasterized automatically (see PlotContainer.add).
+
+        See ScatterPlotter for the other keyword arguments.
+        '''
+        super(ChunkedScatterPlotter, self).__init__([], [], **kwargs)
+        self.source = source
+        self.data_bbox = kwargs.get('data_bbox', None)
+        self.n_points = kwargs.get('n_points', None)
+        self._consumed = False
+
+    def set_source(self, source, data_bbox=None, n_points=None):
+        '''
+        Replace the source of the chunks of data (the arguments are like
+        those of the constructor) and drop the cached bounding box.
+        '''
+        self.source = source
+        self.data_bbox = data_bbox
+        self.n_points = n_points
+        self._consumed = False
+        self.data_changed()
+
+    def set_data(self, *args):
+        raise ValueError('The data of a ChunkedScatterPlotter comes from '
+                         'its source, use set_source to replace it.')
+
+    def _restartable(self):
+        return callable(self.source)
+
+    def _chunks(self):
+        '''Start a pass over the chunks of data.'''
+        if self._restartable():
+            return iter(self.source())
+        if self._consumed:
+            raise ValueError('The chunks of data can only be read once, '
+                             'provide a function that returns them to draw '
+                             'this plot again.')
+        self._consumed = True
+        return iter(self.source)
+
+    def _parts(self, overlap=0):
+        '''
+        Go through the chunks of data, see ScatterPlotter._parts.
+        '''
+        empty = self.datapoints
+        tail = None
+        # Data points of chunks with only y values are numbered.
+        offset = 0
+        try:
+            for chunk in self._chunks():
+                columns = list(chunk)
+                if len(columns) == 1:
+                    n = len(columns[0])
+                    columns.insert(0, numpy.arange(offset, offset + n,
+                                                   dtype=self._dtype))
+                    offset += n
+                part = [as_column(c, self._dtype, self._copy)
+                        for c in columns]
+                N = len(part[0])
+                for column in part:
+                    assert len(column) == N
+                if not N:
+                    continue
+                repeated = 0
+                if tail is not None:
+                    repeated = len(tail[0])
+                    part = [numpy.concatenate((t, c))
+                            for t, c in zip(tail, part)]
+                if overlap:
+                    tail = [column[-overlap:] for column in part]
+                self.datapoints = part
+                self.x_sorted = self._x_sorted_hint
+                yield repeated
+        finally:
+            # Only keep one chunk in memory at a time.
+            self.datapoints = empty
+
+    def _n_points(self):
+        return self.n_points
+
+    def _find_bbox(self):
+        '''Bounding box of the data, reads all chunks (see data_bbox).'''
+        if self.data_bbox is not None:
+            return tuple(self.data_bbox)
+        if not self._restartable():
+            raise ValueError('Data that can only be read once needs a known '
+                             'data range: set the data_bbox or the x_range '
+                             'and y_range of the PlotContainer.')
+        bbox = None
+        for repeated in self._parts():
+            bbox = find_bounding_box(self.datapoints[0], self.datapoints[1],
+                                     bbox, self.x_log, self.y_log)
+        return bbox
+
+    def estimate_size(self):
+        '''
+        Estimate the size of the SVG output from the first chunk, None if
+        the number of data points is not known (see n_points).
+        '''
+        if self.n_points is None or not self._restartable():
+            return None
+        parts = self._parts()
+        try:
+            for repeated in parts:
+                return super(ChunkedScatterPlotter, self).estimate_size()
+        finally:
+            parts.close()
+        return 0, 0
+
+    def draw(self, root_element, x_transform, y_transform):
+        '''Draw scatter plot, a chunk of data at a time.'''
+        # The symbols (and their definitions when instancing) and the group
+        # of data points are shared by the chunks.
+        symbols = self._svg_symbols(root_element)
+        points_element = self._points_element(root_element)
+        n_culled = 0
+        for repeated in self._parts():
+            self._draw_points(points_element, x_transform, y_transform,
+                              symbols)
+            n_culled += self.n_culled
+        self.n_culled = n_culled
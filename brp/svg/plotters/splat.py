@@ -0,0 +1,153 @@
+'''
+Raster engine that stamps pre-rendered symbols (sprites) into an RGBA buffer.
+
+Each symbol is rendered only once (with PIL) to find the pixels it covers.
+The sprites are then stamped at the pixel positions of all data points with
+NumPy array operations, which is much faster than drawing every data point
+with PIL.
+'''
+from __future__ import division
+
+import numpy
+from PIL import Image, ImageDraw
+
+# Symbols are rendered in an image of 2 * SPRITE_RADIUS + 1 pixels square.
+SPRITE_RADIUS = 32
+# Color of the pixels not covered by any sprite (transparent white).
+BACKGROUND_RGBA = (255, 255, 255, 0)
+
+
+def _covered_pixels(symbol, x, y, width, height):
+    '''
+    Find the pixels covered by a symbol drawn (with PIL) at position (x, y)
+    in an image of width by height pixels.
+    '''
+    im = Image.new('L', (width, height), 0)
+    imdraw = ImageDraw.Draw(im)
+
+    def identity(value):
+        return value
+
+    symbol.rdraw(imdraw, identity, identity, x, y, rgba_color=255)
+    return numpy.nonzero(numpy.asarray(im))
+
+
+def render_sprite(symbol):
+    '''
+    Render a symbol once to find the pixels it covers.
+
+    Arguments:
+
+        * `symbol` -- Symbol instance, its rdraw method is used to draw it.
+
+    Returns:
+        A tuple (dy, dx) of NumPy integer arrays with the offsets of the
+        covered pixels relative to the symbol position.
+    '''
+    size = 2 * SPRITE_RADIUS + 1
+    dy, dx = _covered_pixels(symbol, SPRITE_RADIUS, SPRITE_RADIUS, size,
+                             size)
+    return dy - SPRITE_RADIUS, dx - SPRITE_RADIUS
+
+
+def splat(width, height, sprites, px, py, colors, out=None, symbols=None):
+    '''
+    Stamp sprites at the positions of data points into an RGBA buffer.
+
+    Arguments:
+
+        * `width` -- Width of the buffer in pixels.
+        * `height` -- Height of the buffer in pixels.
+        * `sprites` -- List of sprites as returned by render_sprite, all of
+          them are stamped (in order) for each data point.
+        * `px` -- NumPy array of x pixel positions of the data points.
+        * `py` -- NumPy array of y pixel positions of the data points.
+        * `colors` -- Either one RGBA color or a NumPy uint8 array of shape
+          (N, 4) with an RGBA color per data point.
+        * `out` -- Optional buffer (as returned by an earlier call) to stamp
+          the sprites into, this way the data points can be stamped in
+          chunks. Default None (start with an empty buffer).
+        * `symbols` -- Optional list of the symbols the sprites were
+          rendered from, data points close to the top or left edge of the
+          buffer are then drawn with their symbols. Default None (stamp the
+          sprites everywhere).
+
+    Returns:
+        NumPy uint8 array of shape (height, width, 4).
+
+    Note:
+        Like when drawing the data points one by one, data points that come
+        later cover the earlier ones. Data points with non finite positions
+        are skipped.
+
+        PIL truncates coordinates towards zero, so a symbol that crosses
+        the top or left edge of the image can be drawn one pixel wider or
+        narrower than its sprite. Without `symbols` the sprite is stamped
+        there anyway and a few pixels along those edges can differ from
+        drawing the data points one by one.
+    '''
+    n_sprites = len(sprites)
+    colors = numpy.asarray(colors, dtype=numpy.uint8)
+    with numpy.errstate(invalid='ignore'):
+        valid = numpy.isfinite(px) & numpy.isfinite(py)
+    # Positions far outside of the buffer are clipped (no sprite can reach
+    # the buffer from there), this avoids integer overflow. Away from the
+    # top and left edges PIL truncates pixel positions towards minus
+    # infinity.
+    margin = SPRITE_RADIUS + 1
+    fx = numpy.clip(px[valid], -margin, width + margin)
+    fy = numpy.clip(py[valid], -margin, height + margin)
+    ix = numpy.floor(fx).astype(numpy.intp)
+    iy = numpy.floor(fy).astype(numpy.intp)
+    point_keys = numpy.flatnonzero(valid) * n_sprites
+
+    # Data points whose sprites reach negative coordinates, where PIL
+    # truncates towards zero instead, are drawn with their symbols.
+    edge = numpy.zeros(len(ix), dtype=bool)
+    if symbols is not None:
+        assert len(symbols) == n_sprites
+        for dy, dx in sprites:
+            if len(dx):
+                edge |= (ix + dx.min() <= 0) | (iy + dy.min() <= 0)
+        # Clipped data points are too far away to be seen.
+        edge &= (fx > -margin) & (fy > -margin)
+
+    # For every pixel find the last (point, sprite) pair that covers it.
+    owner = numpy.empty(width * height, dtype=numpy.intp)
+    owner.fill(-1)
+    stamped = ~edge
+    stamped_ix = ix[stamped]
+    stamped_iy = iy[stamped]
+    stamped_keys = point_keys[stamped]
+    for i_sprite, (dy, dx) in enumerate(sprites):
+        keys = stamped_keys + i_sprite
+        for oy, ox in zip(dy.tolist(), dx.tolist()):
+            x = stamped_ix + ox
+            y = stamped_iy + oy
+            inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+            flat = y[inside] * width + x[inside]
+            # With repeated pixels the last assignment (highest key) wins.
+            owner[flat] = numpy.maximum(owner[flat], keys[inside])
+    for i in numpy.flatnonzero(edge).tolist():
+        # Only the part of the image up to the symbol is needed.
+        part_width = min(width, max(ix[i] + margin, 1))
+        part_height = min(height, max(iy[i] + margin, 1))
+        for i_sprite, symbol in enumerate(symbols):
+            y, x = _covered_pixels(symbol, fx[i], fy[i], part_width,
+                                   part_height)
+            flat = y * width + x
+            owner[flat] = numpy.maximum(owner[flat],
+                                        point_keys[i] + i_sprite)
+
+    if out is None:
+        buffer = numpy.empty((width * height, 4), dtype=numpy.uint8)
+        buffer[:] = BACKGROUND_RGBA
+    else:
+        assert out.shape == (height, width, 4)
+        buffer = out.reshape((width * height, 4))
+    covered = owner >= 0
+    if colors.ndim == 1:
+        buffer[covered] = colors
+    else:
+        buffer[covered] = colors[owner[covered] // n_sprites]
+    return buffer.reshape((height, width, 4))
@@ -6,10 +6,17 @@ import sys
 #from xml.sax.saxutils import escape
 
 from brp.svg.et_import import ET
+from brp.svg.plotters.splat import render_sprite
 import math
+import itertools
 
 
 class BaseSymbol(object):
+    # False for symbols whose shape depends on the data (not only on the
+    # position of the data point), see has_fixed_shape. Subclasses that
+    # override a drawing method declare it again.
+    fixed_shape = True
+
     def __init__(self, *args, **kwargs):
         self.size = kwargs.get('size', 2)
         self.size = kwargs.get('radius', 2)
@@ -51,8 +58,23 @@ class BaseSymbol(object):
         ]
         imdraw.ellipse(bbox, fill=rgba_color, outline=rgba_color)
 
+    def get_sprite(self):
+        '''
+        Find the pixels covered by the raster version of this symbol.
+
+        Returns:
+            Sprite as returned by brp.svg.plotters.splat.render_sprite or
+            None if the symbol depends on more than the data point position
+            (such symbols are drawn one by one with rdraw).
+        '''
+        if not has_fixed_shape(self):
+            return None
+        return render_sprite(self)
+
 
 class NoSymbol(BaseSymbol):
+    fixed_shape = False
+
     def __init__(self, *args, **kwargs):
         pass
 
@@ -68,6 +90,8 @@ class NoSymbol(BaseSymbol):
 
 
 class SquareSymbol(BaseSymbol):
+    fixed_shape = True
+
     def draw_xy(self, root_element, x, y, *datapoint, **kwargs):
         size = kwargs.get('size', self.size)
         link = kwargs.get('link', self.link)
@@ -102,6 +126,8 @@ class SquareSymbol(BaseSymbol):
 
 
 class VerticalErrorBarSymbol(BaseSymbol):
+    fixed_shape = False
+
     def draw_xy(self, root_element, x, y, *datapoint, **kwargs):
         miny = kwargs.get('miny', y - 7)
         maxy = kwargs.get('maxy', y + 7)
@@ -159,6 +185,8 @@ class VerticalErrorBarSymbol(BaseSymbol):
 
 
 class HorizontalErrorBarSymbol(BaseSymbol):
+    fixed_shape = False
+
     def draw_xy(self, root_element, x, y, *datapoint, **kwargs):
         minx = kwargs.get('minx', x - 7)
         maxx = kwargs.get('maxx', x + 7)
@@ -216,6 +244,8 @@ class HorizontalErrorBarSymbol(BaseSymbol):
 
 
 class LineSymbol(BaseSymbol):
+    fixed_shape = True
+
     def __init__(self, *args, **kwargs):
         self.line_pattern = kwargs.get('linepattern', '')
 
@@ -243,6 +273,8 @@ class RADECSymbol(BaseSymbol):
     The 3rd and 4th entry in the datapoint tuple are mapped to respectively
     Right Ascension and Declination.
     '''
+    fixed_shape = False
+
     def draw_xy(self, root_element, x, y, *datapoint, **kwargs):
         ra = datapoint[2]
         dec = datapoint[3]
@@ -304,6 +336,8 @@ class RADECSymbol(BaseSymbol):
 
 
 class CrossHairSymbol(BaseSymbol):
+    fixed_shape = True
+
     def draw_xy(self, root_element, x, y, *datapoint, **kwargs):
         # only draw if the self.x and self.y lie within the data_bbox
 
@@ -325,6 +359,8 @@ class CrossHairSymbol(BaseSymbol):
 
 
 class RasterDebugSymbol(object):
+    fixed_shape = True
+
     def __init__(self, *args, **kwargs):
         '''Shows (mis-)alignment of PNG (raster) and SVG coordinates.'''
         self.size = kwargs.get('size', 2)
@@ -366,3 +402,225 @@ class RasterDebugSymbol(object):
             ny + size,
         ]
         imdraw.ellipse(bbox, fill=None, outline=rgba_color)
+
+    def get_sprite(self):
+        return render_sprite(self)
+
+
+# Methods that determine what a symbol looks like.
+_DRAWING_METHODS = ('draw', 'draw_xy', 'rdraw')
+
+
+def has_fixed_shape(symbol):
+    '''
+    True if `symbol` looks the same for every data point (only its position
+    and color change), such symbols can be instanced and stamped.
+
+    Symbols declare this with the fixed_shape class attribute. A subclass
+    that overrides a drawing method (draw, draw_xy or rdraw) without
+    declaring fixed_shape itself is assumed to depend on the data (like
+    RADECSymbol does).
+    '''
+    for cls in type(symbol).__mro__:
+        if 'fixed_shape' in vars(cls):
+            return cls.fixed_shape
+        if any(name in vars(cls) for name in _DRAWING_METHODS):
+            return False
+    return False
+
+
+# Identifiers of symbols defined in <defs>, unique within a process (or
+# within a scope set with set_instance_prefix).
+_instance_prefix = 'bs'
+_instance_ids = itertools.count()
+# Placeholder color used to find which attributes carry the color.
+_COLOR_MARKER = 'BRP-COLOR-MARKER'
+
+
+def _draw_definition(symbol, root_element):
+    '''
+    Draw symbol at (0, 0) without color, return the color attribute names.
+
+    Colors are set per <use> element, the definition inherits them.
+    '''
+    scratch = ET.Element('g')
+    symbol.draw_xy(scratch, 0, 0, color=_COLOR_MARKER, link='')
+    color_attributes = set()
+    for element in scratch.findall('.//*'):
+        for key, value in element.items():
+            if value == _COLOR_MARKER:
+                del element.attrib[key]
+                color_attributes.add(key)
+    for element in scratch:
+        root_element.append(element)
+    return color_attributes
+
+
+class InstancedSymbol(object):
+    '''
+    Draws symbols as <use> elements that refer to a single definition.
+
+    Has the same draw_xy interface as the symbols, so plotters can use it
+    in place of the symbols it wraps. The symbols are drawn once at (0, 0)
+    in a <defs> element, every data point then only costs a short <use>
+    element with its position (and color).
+    '''
+    def __init__(self, symbols, defs_element):
+        '''
+        Arguments:
+
+            * `symbols` -- List of symbol instances with a fixed shape (see
+              has_fixed_shape) that carry their color in the same
+              attributes, these are combined in one definition.
+            * `defs_element` -- ElementTree Element (<defs>) that receives
+              the definition of the symbols.
+        '''
+        assert all(has_fixed_shape(symbol) for symbol in symbols)
+        self.link = getattr(symbols[0], 'link', '')
+        self.href = '#%s%d' % (_instance_prefix, next(_instance_ids))
+
+        definition = ET.SubElement(defs_element, 'g')
+        definition.set('id', self.href[1:])
+        self.color_attributes = set()
+        for symbol in symbols:
+            self.color_attributes.update(_draw_definition(symbol,
+                                                          definition))
+        self.color_attributes = sorted(self.color_attributes)
+
+    def draw_xy(self, root_element, x, y, *datapoint, **kwargs):
+        link = kwargs.get('link', self.link)
+
+        if link:
+            root_element = ET.SubElement(root_element, 'a')
+            root_element.set('xlink:href', link)
+
+        u = ET.SubElement(root_element, 'use')
+        u.set('xlink:href', self.href)
+        u.set('x', '%.2f' % x)
+        u.set('y', '%.2f' % y)
+
+        if 'color' in kwargs:
+            for key in self.color_attributes:
+                u.set(key, kwargs['color'])
+
+    def draw(self, root_element, x_transform, y_transform, *datapoint,
+             **kwargs):
+        nx = x_transform(datapoint[0])
+        ny = y_transform(datapoint[1])
+        self.draw_xy(root_element, nx, ny, *datapoint, **kwargs)
+
+
+# The draw methods that only transform the data point position and call
+# draw_xy (with the error bar ends for the error bar symbols).
+_DRAW_XY_METHODS = frozenset(
+    getattr(method, '__func__', method) for method in [
+        BaseSymbol.draw, NoSymbol.draw, VerticalErrorBarSymbol.draw,
+        HorizontalErrorBarSymbol.draw, RasterDebugSymbol.draw,
+        InstancedSymbol.draw])
+
+
+def uses_draw_xy(symbol):
+    '''
+    True if the draw method of `symbol` is one of brp's own, drawing the
+    symbol then comes down to calling draw_xy with the transformed position.
+
+    Plotters transform all data points at once and call draw_xy, symbols
+    that override draw are drawn with their draw method (see DrawAdapter).
+    '''
+    draw = getattr(type(symbol), 'draw', None)
+    return getattr(draw, '__func__', draw) in _DRAW_XY_METHODS
+
+
+class DrawAdapter(object):
+    '''
+    Gives a symbol that overrides draw the draw_xy interface the plotters
+    use, draw_xy ignores the transformed position and calls the draw method
+    of the symbol with the coordinate transforms.
+    '''
+    # Keyword arguments with transformed positions, only meant for draw_xy.
+    _XY_KWARGS = ('minx', 'maxx', 'miny', 'maxy')
+
+    def __init__(self, symbol, x_transform, y_transform):
+        self.symbol = symbol
+        self.x_transform = x_transform
+        self.y_transform = y_transform
+
+    def draw_xy(self, root_element, x, y, *datapoint, **kwargs):
+        for key in self._XY_KWARGS:
+            kwargs.pop(key, None)
+        self.symbol.draw(root_element, self.x_transform, self.y_transform,
+                         *datapoint, **kwargs)
+
+
+def adapt_symbols(symbols, x_transform, y_transform):
+    '''
+    Wrap the symbols that override draw in a DrawAdapter.
+
+    Arguments:
+
+        * `symbols` -- List of symbol instances.
+        * `x_transform` -- Function that transforms data x coordinates.
+        * `y_transform` -- Function that transforms data y coordinates.
+
+    Returns:
+        List of objects with a draw_xy method to draw with.
+    '''
+    return [s if uses_draw_xy(s) else DrawAdapter(s, x_transform,
+                                                  y_transform)
+            for s in symbols]
+
+
+def set_instance_prefix(prefix, ids=None):
+    '''
+    Number the symbol definitions drawn from now on prefix0, prefix1, ...
+
+    Arguments:
+
+        * `prefix` -- String, prefix of the definition ids.
+        * `ids` -- Optional iterator over the numbers, default a new
+          itertools.count().
+
+    Returns:
+        The previous (prefix, ids) tuple, pass it back to restore the
+        previous numbering.
+    '''
+    global _instance_prefix, _instance_ids
+    previous = _instance_prefix, _instance_ids
+    _instance_prefix = prefix
+    _instance_ids = itertools.count() if ids is None else ids
+    return previous
+
+
+def instance_symbols(symbols, root_element):
+    '''
+    Replace the symbols with a fixed shape by InstancedSymbol instances.
+
+    Consecutive symbols with a fixed shape that carry their color in the same
+    attributes share one InstancedSymbol (one <use> element per data point
+    for most combinations of symbols).
+
+    Arguments:
+
+        * `symbols` -- List of symbol instances.
+        * `root_element` -- ElementTree Element, a <defs> element with the
+          symbol definitions is added to it (if needed).
+
+    Returns:
+        List of symbols to draw with.
+    '''
+    if not any(has_fixed_shape(s) and uses_draw_xy(s) for s in symbols):
+        return symbols
+    defs = ET.SubElement(root_element, 'defs')
+    def key(symbol):
+        # Symbols that override draw can not be drawn from a definition.
+        if not has_fixed_shape(symbol) or not uses_draw_xy(symbol):
+            return None
+        return sorted(_draw_definition(symbol, ET.Element('g')))
+
+    instanced = []
+    for color_attributes, group in itertools.groupby(symbols, key):
+        if color_attributes is not None:
+            instanced.append(InstancedSymbol(list(group), defs))
+        else:
+            instanced.extend(group)
+    return instanced
@@ -0,0 +1,199 @@
+'''
+Per plot layer profiling of SVGCanvas.draw and PlotContainer.draw.
+
+Pass a Profiler to the draw method to find out where the time goes. For
+every plot layer the time spent in each phase is recorded (prepare_bbox,
+done_bbox, draw or rdraw, png and serialize) together with the number of
+SVG elements and bytes the layer produced and, optionally, the peak memory
+use of the process after the layer was drawn.
+'''
+from __future__ import division
+import time
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Plot layer that is being measured in the current thread (see phase).
+_current = threading.local()
+
+PHASES = ['prepare_bbox', 'done_bbox', 'draw', 'rdraw', 'png', 'serialize']
+
+
+class LayerProfile(object):
+    '''
+    Measurements for one plot layer.
+
+    Attributes:
+
+        * `container` -- Index of the PlotContainer on the SVGCanvas (None
+          when drawing a PlotContainer by itself).
+        * `layer` -- Index of the plot layer in the PlotContainer, the axes
+          come after the plot layers that were added.
+        * `plotter` -- Class name of the plotter.
+        * `raster` -- Boolean, True if the rasterized fallback was drawn.
+        * `times` -- Dictionary, phase name -> seconds. The png phase (PNG
+          and base64 encoding) is part of the draw or rdraw phase.
+        * `n_elements` -- Number of SVG elements produced.
+        * `n_bytes` -- Number of bytes of SVG produced, None if the layer
+          was not serialized while drawing (PlotContainer.draw without a
+          stream).
+        * `peak_rss_kb` -- Peak resident set size of the process in kB after
+          drawing this layer, None unless the Profiler samples memory.
+    '''
+    def __init__(self, container, layer, plotter):
+        self.container = container
+        self.layer = layer
+        self.plotter = plotter.__class__.__name__
+        self.raster = False
+        self.times = {}
+        self.n_elements = 0
+        self.n_bytes = 0
+        self.peak_rss_kb = None
+
+    def add_time(self, phase, seconds):
+        self.times[phase] = self.times.get(phase, 0) + seconds
+
+    def total_time(self):
+        '''Seconds spent on this layer (the nested png phase not counted).'''
+        return sum(t for p, t in self.times.items() if p != 'png')
+
+    def as_dict(self):
+        '''The measurements as a dictionary (for metrics pipelines).'''
+        return {
+            'container': self.container,
+            'layer': self.layer,
+            'plotter': self.plotter,
+            'raster': self.raster,
+            'times': dict(self.times),
+            'n_elements': self.n_elements,
+            'n_bytes': self.n_bytes,
+            'peak_rss_kb': self.peak_rss_kb,
+        }
+
+    def __str__(self):
+        phases = ', '.join('%s %.4fs' % (p, self.times[p]) for p in PHASES
+                           if p in self.times)
+        if self.n_bytes is None:
+            n_bytes = 'unknown'
+        else:
+            n_bytes = '%d' % self.n_bytes
+        return '%s[%s.%s] %s: %.4fs (%s), %d elements, %s bytes' % (
+            self.plotter, self.container, self.layer,
+            'raster' if self.raster else 'vector', self.total_time(), phases,
+            self.n_elements, n_bytes)
+
+
+class Profiler(object):
+    '''
+    Collects LayerProfile measurements while drawing.
+
+    Usage:
+
+        profiler = Profiler()
+        canvas.draw(file, profiler=profiler)
+        print(profiler.format())
+    '''
+    def __init__(self, callback=None, memory=False):
+        '''
+        Arguments:
+
+            * `callback` -- Optional function, called with each LayerProfile
+              as soon as the plot layer is done.
+            * `memory` -- Boolean, if True sample the peak memory use after
+              each plot layer (not available on all platforms). Default
+              False.
+        '''
+        self.callback = callback
+        self.memory = memory and resource is not None
+        self.layers = []
+        # Index of the PlotContainer being drawn (set by SVGCanvas).
+        self.container = None
+        # Phases of drawing that are not specific to a plot layer (like
+        # writing the whole document), name -> seconds.
+        self.times = {}
+
+    def layer(self, layer, plotter):
+        '''Start the measurements for a plot layer.'''
+        record = LayerProfile(self.container, layer, plotter)
+        self.layers.append(record)
+        return record
+
+    def done(self, record):
+        '''Finish the measurements for a plot layer.'''
+        if self.memory:
+            record.peak_rss_kb = resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss
+        if self.callback is not None:
+            self.callback(record)
+
+    def add(self, records):
+        '''Add finished measurements (made in another process).'''
+        for record in records:
+            self.layers.append(record)
+            if self.callback is not None:
+                self.callback(record)
+
+    @contextmanager
+    def timed(self, name):
+        '''Time a phase of drawing that is not specific to a plot layer.'''
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.times[name] = self.times.get(name, 0) + time.time() - start
+
+    def slowest(self, n=5):
+        '''The `n` plot layers that took the most time.'''
+        return sorted(self.layers, key=lambda r: r.total_time(),
+                      reverse=True)[:n]
+
+    def as_dicts(self):
+        '''All measurements as a list of dictionaries.'''
+        return [record.as_dict() for record in self.layers]
+
+    def format(self):
+        '''Format the measurements, one line per plot layer.'''
+        lines = [str(record) for record in self.layers]
+        lines.extend('%s: %.4fs' % item for item in sorted(self.times.items()))
+        return '\n'.join(lines)
+
+
+@contextmanager
+def timed(profiler, name):
+    '''See Profiler.timed, nothing is done if `profiler` is None.'''
+    if profiler is None:
+        yield
+    else:
+        with profiler.timed(name):
+            yield
+
+
+@contextmanager
+def measure(record, phase):
+    '''
+    Time a phase of a plot layer, nothing is done if `record` is None.
+
+    Nested phase() calls (in the same thread) are added to `record`.
+    '''
+    if record is None:
+        yield
+        return
+    previous = getattr(_current, 'record', None)
+    _current.record = record
+    start = time.time()
+    try:
+        yield
+    finally:
+        record.add_time(phase, time.time() - start)
+        _current.record = previous
+
+
+@contextmanager
+def phase(name):
+    '''Time a phase within the plot layer that is being measured (if any).'''
+    with measure(getattr(_current, 'record', None), name):
+        yield
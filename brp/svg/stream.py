@@ -0,0 +1,53 @@
+'''
+Incremental serialization of SVG documents.
+
+The SVGStreamWriter writes the elements of an SVG document to a file like
+object as soon as they are produced. Only the part of the document that is
+currently being drawn has to be kept in memory as ElementTree Elements.
+'''
+from brp.svg.et_import import ET
+
+_MARKER = 'BRP-STREAM-MARKER'
+
+
+class SVGStreamWriter(object):
+    '''
+    Write an SVG document to a file like object piece by piece.
+
+    Usage: call start() with the (empty) root element, call flush() whenever
+    new children were added to the root element and finally call end().
+    The output is identical to serializing the complete tree in one go.
+    '''
+    def __init__(self, file):
+        '''
+        Arguments :
+
+            * `file` --- File like object that receives the SVG.
+        '''
+        self.file = file
+        self.end_tag = None
+
+    def start(self, root_element):
+        '''Write the start tag of `root_element` (ignoring its children).'''
+        tmp = ET.Element(root_element.tag, dict(root_element.items()))
+        tmp.text = _MARKER
+        start_tag, self.end_tag = ET.tostring(tmp).split(_MARKER)
+        self.file.write(start_tag)
+
+    def write(self, element):
+        '''Write `element` and all its children.'''
+        self.file.write(ET.tostring(element))
+
+    def write_serialized(self, svg):
+        '''Write SVG that was already serialized (with ET.tostring).'''
+        self.file.write(svg)
+
+    def flush(self, root_element):
+        '''Write all children of `root_element` and then remove them.'''
+        for child in root_element:
+            self.write(child)
+        del root_element[:]
+
+    def end(self):
+        '''Write the end tag of the root element.'''
+        self.file.write(self.end_tag)
@@ -0,0 +1,245 @@
+'''
+Rendering benchmarks for the brp plotters.
+
+Renders standard workloads (random data, generated offline with a fixed
+seed) at several sizes and writes one JSON object per run to stdout:
+
+    python tests/benchmark.py > results.jsonl
+    python tests/benchmark.py -w line,hist2d -s 1000,1000000
+    python tests/benchmark.py --compare old.jsonl new.jsonl
+
+Each run is done in a fresh Python process, so that the peak memory (the
+maximum resident set size) belongs to that run alone. Recorded are the
+time to set up the plotters (including any binning), the time to draw the
+SVG, the peak memory, the number of SVG elements and the number of bytes
+of output (after compression if requested). Note that the vector workloads
+at 10 ** 7 points produce SVG files of several hundred MB.
+'''
+from __future__ import division
+import sys
+import os
+import time
+import json
+import platform
+import resource
+import subprocess
+from optparse import OptionParser
+
+import numpy
+
+from brp.svg.base import SVGCanvas, PlotContainer
+from brp.svg.plotters.scatter import ScatterPlotter
+from brp.svg.plotters.line import LinePlotter
+from brp.svg.plotters.error import ErrorPlotter
+from brp.svg.plotters.histogram import HistogramPlotter, bin_data
+from brp.svg.plotters.newhist2d import Histogram2dPlotter, Array2dPlotter
+from brp.svg.plotters.gradient import RGBGradient
+from brp.svg.plotters.symbol import NoSymbol
+
+WIDTH = 800
+HEIGHT = 600
+SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+SEED = 12345
+
+
+def scatter_gradient(n, rng, raster=False):
+    x = rng.standard_normal(n)
+    y = rng.standard_normal(n)
+    c = rng.uniform(0, 1, n)
+    gradient = RGBGradient((0, 1), (0, 0, 1), (1, 0, 0))
+    return [(ScatterPlotter(x, y, c, gradient=gradient, gradient_i=2),
+             raster)]
+
+
+def line(n, rng, raster=False):
+    x = numpy.arange(n, dtype=numpy.float64)
+    y = numpy.cumsum(rng.standard_normal(n))
+    return [(LinePlotter(x, y, symbol=NoSymbol, x_sorted=True), raster)]
+
+
+def error(n, rng, raster=False):
+    x = rng.standard_normal(n)
+    y = rng.standard_normal(n)
+    err = numpy.abs(rng.standard_normal((n, 2))) * 0.05
+    return [(ErrorPlotter(x, y, err_x=err, err_y=err[:, ::-1]), raster)]
+
+
+def histogram(n, rng):
+    return [(HistogramPlotter(bin_data(rng.standard_normal(n), 100)),
+             False)]
+
+
+def hist2d(n, rng):
+    x = rng.standard_normal(n)
+    y = rng.standard_normal(n)
+    return [(Histogram2dPlotter(x, y, x_bins=200, y_bins=200), False)]
+
+
+def array2d(n, rng):
+    side = int(round(n ** 0.5))
+    ar = rng.uniform(0, 1, (side, side))
+    return [(Array2dPlotter(ar, (0, 0, 1, 1)), False)]
+
+
+# Name -> function(n, rng) returning a list of (plotter, raster) tuples.
+WORKLOADS = [
+    ('scatter_gradient', scatter_gradient),
+    ('line', line),
+    ('error', error),
+    ('histogram', histogram),
+    ('hist2d', hist2d),
+    ('array2d', array2d),
+    ('scatter_raster', lambda n, rng: scatter_gradient(n, rng, True)),
+    ('line_raster', lambda n, rng: line(n, rng, True)),
+    ('error_raster', lambda n, rng: error(n, rng, True)),
+]
+
+
+class CountingFile(object):
+    '''File like object that only counts bytes and SVG elements.'''
+    def __init__(self):
+        self.n_bytes = 0
+        self.n_elements = 0
+
+    def write(self, data):
+        self.n_bytes += len(data)
+        # Every element has a start tag, end tags start with '</'.
+        self.n_elements += data.count('<') - data.count('</')
+
+
+def max_rss_kb():
+    '''Maximum resident set size of this process (in kB on Linux).'''
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_one(name, n, options):
+    '''Run a single benchmark in this process, return the result.'''
+    make_layers = dict(WORKLOADS)[name]
+    rss_start = max_rss_kb()
+
+    t0 = time.time()
+    rng = numpy.random.RandomState(SEED)
+    canvas = SVGCanvas(WIDTH, HEIGHT)
+    container = PlotContainer(0, 0, WIDTH, HEIGHT)
+    for plotter, raster in make_layers(n, rng):
+        container.add(plotter, raster)
+    canvas.add(container)
+    t1 = time.time()
+    rss_setup = max_rss_kb()
+
+    out = CountingFile()
+    canvas.draw(out, streaming=options.streaming,
+                compression=options.compression)
+    t2 = time.time()
+
+    return {
+        'workload': name,
+        'n_points': n,
+        'setup_s': round(t1 - t0, 6),
+        'draw_s': round(t2 - t1, 6),
+        'peak_rss_kb': max_rss_kb(),
+        'setup_rss_kb': rss_setup,
+        'start_rss_kb': rss_start,
+        # Elements cannot be counted in compressed output.
+        'n_elements': (out.n_elements if options.compression is None
+                       else None),
+        'n_bytes': out.n_bytes,
+        'streaming': options.streaming,
+        'compression': options.compression,
+        'raster_layers': sum(d.raster for d in canvas.raster_report),
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'machine': platform.machine(),
+    }
+
+
+def run_all(options):
+    '''Run the selected benchmarks, each in a new process.'''
+    names = [name for name, f in WORKLOADS]
+    if options.workloads:
+        names = options.workloads.split(',')
+    sizes = SIZES
+    if options.sizes:
+        sizes = [int(float(s)) for s in options.sizes.split(',')]
+    extra = []
+    if options.streaming:
+        extra.append('--streaming')
+    if options.compression is not None:
+        extra.extend(['--compression', str(options.compression)])
+
+    for name in names:
+        for n in sizes:
+            for repeat in range(options.repeat):
+                cmd = [sys.executable, os.path.abspath(__file__),
+                       '--single', '%s:%d' % (name, n)] + extra
+                try:
+                    output = subprocess.Popen(
+                        cmd, stdout=subprocess.PIPE).communicate()[0]
+                    result = json.loads(output)
+                except ValueError:
+                    result = {'workload': name, 'n_points': n,
+                              'error': 'run failed'}
+                result['repeat'] = repeat
+                sys.stdout.write(json.dumps(result, sort_keys=True) + '\n')
+                sys.stdout.flush()
+
+
+def load(filename):
+    '''Load results, keep the fastest draw of each workload and size.'''
+    results = {}
+    for line in open(filename):
+        if not line.strip():
+            continue
+        result = json.loads(line)
+        if 'error' in result:
+            continue
+        key = (result['workload'], result['n_points'])
+        if key not in results or result['draw_s'] < results[key]['draw_s']:
+            results[key] = result
+    return results
+
+
+def compare(old_filename, new_filename):
+    '''Print draw time, peak memory and output size ratios (new / old).'''
+    old = load(old_filename)
+    new = load(new_filename)
+    print('%-18s %9s %9s %9s %9s' % ('workload', 'points', 'draw', 'memory',
+                                     'bytes'))
+    for key in sorted(set(old) & set(new)):
+        ratios = []
+        for field in ('draw_s', 'peak_rss_kb', 'n_bytes'):
+            if old[key][field]:
+                ratios.append('%8.2fx' % (new[key][field] / old[key][field]))
+            else:
+                ratios.append('%9s' % '-')
+        print('%-18s %9d %s' % (key[0], key[1], ' '.join(ratios)))
+
+
+if __name__ == '__main__':
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('-w', '--workloads', help='comma separated names, '
+                      'default all of: ' + ','.join(n for n, f in WORKLOADS))
+    parser.add_option('-s', '--sizes', help='comma separated numbers of '
+                      'points, default 1e3,1e4,1e5,1e6,1e7')
+    parser.add_option('-r', '--repeat', type='int', default=1,
+                      help='number of runs of each benchmark, default 1')
+    parser.add_option('--streaming', action='store_true', default=False,
+                      help='draw with streaming=True')
+    parser.add_option('--compression', type='int', default=None,
+                      help='draw compressed SVG with this gzip level')
+    parser.add_option('--compare', action='store_true', default=False,
+                      help='compare two result files: OLD NEW')
+    parser.add_option('--single', help='run one benchmark NAME:N in this '
+                      'process (used internally)')
+    options, args = parser.parse_args()
+
+    if options.compare:
+        if len(args) != 2:
+            parser.error('--compare needs two result files')
+        compare(args[0], args[1])
+    elif options.single:
+        name, n = options.single.split(':')
+        result = run_one(name, int(n), options)
+        sys.stdout.write(json.dumps(result, sort_keys=True))
+    else:
+        run_all(options)